@@ -0,0 +1,146 @@
+"""
+Approximate nearest-neighbour (ANN) search for large indexes.
+
+IVF ("inverted file") backend, pure NumPy:
+- Cluster the (normalized) embeddings into n_lists groups with k-means.
+- Each chunk is stored in the list of its closest centroid.
+- At query time, only the `nprobe` lists closest to the query are scored.
+
+More lists / fewer probes -> faster but lower recall.
+Use app.index.evaluate_ann_recall to check recall against exact search.
+"""
+
+from typing import Dict, Any, Optional, Tuple
+
+import numpy as np
+
+# Default number of lists probed per query
+DEFAULT_NPROBE = 8
+
+# Rows scored per block when assigning vectors to lists
+ASSIGN_BLOCK_SIZE = 65536
+
+
+def default_n_lists(n_vectors: int) -> int:
+    """
+    Rule of thumb: about 4 * sqrt(N) lists, at least 1.
+    """
+    return max(1, int(4 * np.sqrt(n_vectors)))
+
+
+def assign_to_lists(centroids: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """
+    Returns, for each row of `vectors`, the id of its closest centroid
+    (highest dot product, since everything is normalized).
+    """
+    assignments = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], ASSIGN_BLOCK_SIZE):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK_SIZE], dtype="float32")
+        assignments[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def _train_centroids(
+    vectors: np.ndarray,
+    n_lists: int,
+    n_iter: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """
+    Spherical k-means: centroids are re-normalized after every update.
+    """
+    init = rng.choice(vectors.shape[0], size=n_lists, replace=False)
+    centroids = np.array(vectors[init], dtype="float32")
+
+    for _ in range(n_iter):
+        assignments = assign_to_lists(centroids, vectors)
+
+        # Per-list sums: sort rows by list, then one reduceat over the groups
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_lists)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        non_empty = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[non_empty] = np.add.reduceat(vectors[order], starts[non_empty], axis=0)
+
+        # Empty lists get re-seeded with a random vector
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            sums[empty] = vectors[rng.choice(vectors.shape[0], size=empty.size)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms == 0, 1.0, norms)
+
+    return centroids.astype("float32")
+
+
+def build_list_layout(assignments: np.ndarray, n_lists: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Turn per-row list assignments into a compact layout:
+    - list_ids: row ids grouped by list
+    - list_offsets: list i is list_ids[list_offsets[i]:list_offsets[i + 1]]
+    """
+    list_ids = np.argsort(assignments, kind="stable").astype(np.int64)
+    counts = np.bincount(assignments, minlength=n_lists)
+    list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    np.cumsum(counts, out=list_offsets[1:])
+    return list_ids, list_offsets
+
+
+def build_ivf(
+    embeddings: np.ndarray,
+    n_lists: Optional[int] = None,
+    n_iter: int = 10,
+    max_training_vectors: int = 100_000,
+    nprobe: int = DEFAULT_NPROBE,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Build an IVF structure over normalized embeddings of shape (N, D).
+
+    k-means is trained on a random sample of at most
+    `max_training_vectors` rows, then every row is assigned to a list.
+    """
+    n_vectors = embeddings.shape[0]
+    if n_vectors == 0:
+        raise ValueError("Cannot build an IVF index over zero vectors.")
+
+    n_lists = min(n_lists or default_n_lists(n_vectors), n_vectors)
+    rng = np.random.default_rng(seed)
+
+    if n_vectors > max_training_vectors:
+        sample_rows = np.sort(rng.choice(n_vectors, size=max_training_vectors, replace=False))
+        training = np.asarray(embeddings[sample_rows], dtype="float32")
+    else:
+        training = np.asarray(embeddings, dtype="float32")
+
+    centroids = _train_centroids(training, n_lists, n_iter, rng)
+    assignments = assign_to_lists(centroids, embeddings)
+    list_ids, list_offsets = build_list_layout(assignments, n_lists)
+
+    return {
+        "centroids": centroids,
+        "assignments": assignments,
+        "list_ids": list_ids,
+        "list_offsets": list_offsets,
+        "nprobe": nprobe,
+    }
+
+
+def ivf_candidates(ivf: Dict[str, Any], query_embedding: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+    """
+    Row ids stored in the `nprobe` lists closest to the query.
+    """
+    centroids = ivf["centroids"]
+    nprobe = min(nprobe or ivf.get("nprobe", DEFAULT_NPROBE), centroids.shape[0])
+
+    centroid_scores = centroids @ query_embedding
+    if nprobe < centroids.shape[0]:
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+    else:
+        probe = np.arange(centroids.shape[0])
+
+    list_ids = ivf["list_ids"]
+    list_offsets = ivf["list_offsets"]
+    parts = [list_ids[list_offsets[i]:list_offsets[i + 1]] for i in probe]
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
@@ -0,0 +1,303 @@
+"""
+Columnar storage for the chunks of an index.
+
+Instead of one pydantic DocumentChunk object per chunk, the index keeps:
+- doc_codes:      int32 array, index into doc_vocab (the distinct doc_ids)
+- pages:          int32 array
+- modality_codes: int8 array, index into MODALITIES
+- content / ids / extra: one contiguous UTF-8 blob each + int64 offsets
+  (row i is blob[offsets[i]:offsets[i + 1]]; extra is JSON, empty for None)
+
+DocumentChunk objects are only created when a row is read (store[i]),
+e.g. for the top-k results of a search. A ChunkStore behaves like a
+read-only list of DocumentChunk (len, indexing, iteration).
+"""
+
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, get_args
+import json
+import os
+
+import numpy as np
+
+from app.models import DocumentChunk, Modality
+
+MODALITIES = get_args(Modality)
+_MODALITY_TO_CODE = {m: code for code, m in enumerate(MODALITIES)}
+
+# File names inside an index folder
+_ARRAY_FILES = {
+    "doc_codes": "chunks_doc_codes.npy",
+    "pages": "chunks_pages.npy",
+    "modality_codes": "chunks_modality_codes.npy",
+    "content_blob": "chunks_content.bin.npy",
+    "content_offsets": "chunks_content_offsets.npy",
+    "id_blob": "chunks_ids.bin.npy",
+    "id_offsets": "chunks_ids_offsets.npy",
+    "extra_blob": "chunks_extra.bin.npy",
+    "extra_offsets": "chunks_extra_offsets.npy",
+}
+_DOC_VOCAB_FILE = "chunks_doc_vocab.json"
+
+
+def _pack_strings(values: Sequence[str]) -> "tuple[np.ndarray, np.ndarray]":
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8).copy()
+    return blob, offsets
+
+
+def _unpack_string(blob: np.ndarray, offsets: np.ndarray, row: int) -> str:
+    return blob[offsets[row]:offsets[row + 1]].tobytes().decode("utf-8")
+
+
+def _concat_blobs(parts: List["tuple[np.ndarray, np.ndarray]"]) -> "tuple[np.ndarray, np.ndarray]":
+    blobs = [np.asarray(blob) for blob, _ in parts]
+    offsets = [np.zeros(1, dtype=np.int64)]
+    base = 0
+    for blob, part_offsets in parts:
+        offsets.append(np.asarray(part_offsets[1:]) + base)
+        base += blob.shape[0]
+    return np.concatenate(blobs).astype(np.uint8), np.concatenate(offsets).astype(np.int64)
+
+
+def _select_blob(blob: np.ndarray, offsets: np.ndarray, rows: np.ndarray) -> "tuple[np.ndarray, np.ndarray]":
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    if new_offsets[-1] == 0:
+        return np.zeros(0, dtype=np.uint8), new_offsets
+    # Byte positions of every selected row, gathered in one fancy-index
+    positions = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    return np.asarray(blob)[positions], new_offsets
+
+
+class ChunkStore:
+    """
+    Compact, column-oriented list of chunks. See module docstring.
+    """
+
+    def __init__(
+        self,
+        doc_vocab: List[str],
+        doc_codes: np.ndarray,
+        pages: np.ndarray,
+        modality_codes: np.ndarray,
+        content_blob: np.ndarray,
+        content_offsets: np.ndarray,
+        id_blob: np.ndarray,
+        id_offsets: np.ndarray,
+        extra_blob: np.ndarray,
+        extra_offsets: np.ndarray,
+    ):
+        self.doc_vocab = list(doc_vocab)
+        self.doc_codes = doc_codes
+        self.pages = pages
+        self.modality_codes = modality_codes
+        self.content_blob = content_blob
+        self.content_offsets = content_offsets
+        self.id_blob = id_blob
+        self.id_offsets = id_offsets
+        self.extra_blob = extra_blob
+        self.extra_offsets = extra_offsets
+
+    # ---- building ----
+
+    @classmethod
+    def from_chunks(cls, chunks: Sequence[DocumentChunk], doc_vocab: Optional[List[str]] = None) -> "ChunkStore":
+        doc_vocab = list(doc_vocab or [])
+        doc_to_code = {d: code for code, d in enumerate(doc_vocab)}
+        doc_codes = np.empty(len(chunks), dtype=np.int32)
+        for row, chunk in enumerate(chunks):
+            code = doc_to_code.get(chunk.doc_id)
+            if code is None:
+                code = doc_to_code[chunk.doc_id] = len(doc_vocab)
+                doc_vocab.append(chunk.doc_id)
+            doc_codes[row] = code
+
+        content_blob, content_offsets = _pack_strings([c.content for c in chunks])
+        id_blob, id_offsets = _pack_strings([c.id for c in chunks])
+        extra_blob, extra_offsets = _pack_strings(
+            [json.dumps(c.extra) if c.extra is not None else "" for c in chunks]
+        )
+
+        return cls(
+            doc_vocab=doc_vocab,
+            doc_codes=doc_codes,
+            pages=np.array([c.page for c in chunks], dtype=np.int32),
+            modality_codes=np.array([_MODALITY_TO_CODE[c.modality] for c in chunks], dtype=np.int8),
+            content_blob=content_blob,
+            content_offsets=content_offsets,
+            id_blob=id_blob,
+            id_offsets=id_offsets,
+            extra_blob=extra_blob,
+            extra_offsets=extra_offsets,
+        )
+
+    @classmethod
+    def empty(cls) -> "ChunkStore":
+        return cls.from_chunks([])
+
+    @classmethod
+    def concat(cls, stores: Sequence["ChunkStore"]) -> "ChunkStore":
+        """
+        One store holding the rows of all `stores`, in order.
+        doc_codes are remapped onto a merged doc_vocab.
+        """
+        if not stores:
+            return cls.empty()
+
+        doc_vocab: List[str] = []
+        doc_to_code: Dict[str, int] = {}
+        doc_code_parts = []
+        for store in stores:
+            remap = np.empty(len(store.doc_vocab), dtype=np.int32)
+            for old_code, doc_id in enumerate(store.doc_vocab):
+                if doc_id not in doc_to_code:
+                    doc_to_code[doc_id] = len(doc_vocab)
+                    doc_vocab.append(doc_id)
+                remap[old_code] = doc_to_code[doc_id]
+            doc_code_parts.append(remap[np.asarray(store.doc_codes)] if len(store) else np.zeros(0, dtype=np.int32))
+
+        content_blob, content_offsets = _concat_blobs([(s.content_blob, s.content_offsets) for s in stores])
+        id_blob, id_offsets = _concat_blobs([(s.id_blob, s.id_offsets) for s in stores])
+        extra_blob, extra_offsets = _concat_blobs([(s.extra_blob, s.extra_offsets) for s in stores])
+
+        return cls(
+            doc_vocab=doc_vocab,
+            doc_codes=np.concatenate(doc_code_parts).astype(np.int32),
+            pages=np.concatenate([np.asarray(s.pages) for s in stores]).astype(np.int32),
+            modality_codes=np.concatenate([np.asarray(s.modality_codes) for s in stores]).astype(np.int8),
+            content_blob=content_blob,
+            content_offsets=content_offsets,
+            id_blob=id_blob,
+            id_offsets=id_offsets,
+            extra_blob=extra_blob,
+            extra_offsets=extra_offsets,
+        )
+
+    def extend(self, chunks: Sequence[DocumentChunk]) -> None:
+        """
+        Append chunks in place (columns are re-allocated, so prefer
+        one call with many chunks over many calls with one).
+        """
+        if not chunks:
+            return
+        merged = ChunkStore.concat([self, ChunkStore.from_chunks(chunks, doc_vocab=self.doc_vocab)])
+        self.__dict__.update(merged.__dict__)
+
+    def select(self, rows: np.ndarray) -> "ChunkStore":
+        """
+        New store with only `rows` (in that order). doc_vocab is kept as is.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        content_blob, content_offsets = _select_blob(self.content_blob, self.content_offsets, rows)
+        id_blob, id_offsets = _select_blob(self.id_blob, self.id_offsets, rows)
+        extra_blob, extra_offsets = _select_blob(self.extra_blob, self.extra_offsets, rows)
+        return ChunkStore(
+            doc_vocab=self.doc_vocab,
+            doc_codes=np.asarray(self.doc_codes)[rows],
+            pages=np.asarray(self.pages)[rows],
+            modality_codes=np.asarray(self.modality_codes)[rows],
+            content_blob=content_blob,
+            content_offsets=content_offsets,
+            id_blob=id_blob,
+            id_offsets=id_offsets,
+            extra_blob=extra_blob,
+            extra_offsets=extra_offsets,
+        )
+
+    # ---- reading ----
+
+    def __len__(self) -> int:
+        return int(self.doc_codes.shape[0])
+
+    def __getitem__(self, row: int) -> DocumentChunk:
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(f"Chunk row {row} out of range (0..{len(self) - 1})")
+
+        extra_json = _unpack_string(self.extra_blob, self.extra_offsets, row)
+        return DocumentChunk(
+            id=self.get_id(row),
+            doc_id=self.doc_vocab[int(self.doc_codes[row])],
+            modality=MODALITIES[int(self.modality_codes[row])],
+            page=int(self.pages[row]),
+            content=self.get_content(row),
+            extra=json.loads(extra_json) if extra_json else None,
+        )
+
+    def __iter__(self) -> Iterator[DocumentChunk]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def get_content(self, row: int) -> str:
+        return _unpack_string(self.content_blob, self.content_offsets, int(row))
+
+    def get_id(self, row: int) -> str:
+        return _unpack_string(self.id_blob, self.id_offsets, int(row))
+
+    def ids(self) -> List[str]:
+        """
+        All chunk ids, in row order.
+        """
+        raw = np.asarray(self.id_blob).tobytes()
+        offsets = np.asarray(self.id_offsets).tolist()
+        return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(self))]
+
+    def contents(self) -> List[str]:
+        """
+        All chunk texts, in row order.
+        """
+        raw = np.asarray(self.content_blob).tobytes()
+        offsets = np.asarray(self.content_offsets).tolist()
+        return [raw[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(self))]
+
+    def doc_code(self, doc_id: str) -> Optional[int]:
+        try:
+            return self.doc_vocab.index(doc_id)
+        except ValueError:
+            return None
+
+    def nbytes(self) -> int:
+        """
+        Memory held by the columns (not counting doc_vocab).
+        """
+        return sum(int(np.asarray(getattr(self, attr)).nbytes) for attr in _ARRAY_FILES)
+
+    # ---- persistence ----
+
+    def save(self, folder: Path) -> None:
+        folder = Path(folder)
+        # Write to temp files and swap them in, so a store that is currently
+        # memory-mapped from this folder keeps reading the old files
+        for attr, file_name in _ARRAY_FILES.items():
+            tmp_path = folder / (file_name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.asarray(getattr(self, attr)))
+            os.replace(tmp_path, folder / file_name)
+        with open(folder / _DOC_VOCAB_FILE, "w", encoding="utf-8") as f:
+            json.dump(self.doc_vocab, f)
+
+    @classmethod
+    def load(cls, folder: Path, mmap: bool = True) -> "ChunkStore":
+        """
+        Load a saved store. With mmap=True the columns are memory-mapped,
+        so only the rows that are actually read get paged in.
+        """
+        folder = Path(folder)
+        mmap_mode = "r" if mmap else None
+        columns = {}
+        for attr, file_name in _ARRAY_FILES.items():
+            try:
+                columns[attr] = np.load(folder / file_name, mmap_mode=mmap_mode)
+            except ValueError:
+                # Empty arrays can't be memory-mapped
+                columns[attr] = np.load(folder / file_name)
+        with open(folder / _DOC_VOCAB_FILE, "r", encoding="utf-8") as f:
+            doc_vocab = json.load(f)
+        return cls(doc_vocab=doc_vocab, **columns)
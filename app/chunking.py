@@ -1,12 +1,37 @@
 """
 Functions for smartly splitting (chunking) long texts into smaller pieces.
 STEP 4: Basic paragraph + word-limit chunking.
+
+Chunks are sized in tokens of the embedding model (see split_pages_into_token_chunks):
+- text is split into sentences (paragraph breaks always end a sentence),
+- sentences are packed into chunks of at most `max_tokens` tokens,
+- the last sentences of a chunk (up to `overlap_tokens`) start the next one,
+- a single sentence longer than `max_tokens` is cut at token boundaries.
+
+All sentences of a batch of pages are tokenized with one call to the
+fast tokenizer, instead of one call per sentence.
 """
 
-from typing import List
-import uuid
+from typing import List, Optional, Sequence, Tuple
+import re
 
+from app.embeddings import get_text_tokenizer, TEXT_EMBEDDING_MAX_TOKENS
 from app.models import DocumentChunk
+from app.tracing import span
+from app.utils import ChunkIdAllocator
+
+# ~500 characters of English text: fits the embedder (256 tokens) with room
+# to spare and roughly matches what format_context_for_prompt keeps per chunk
+DEFAULT_CHUNK_TOKENS = 128
+DEFAULT_OVERLAP_TOKENS = 16
+
+# Sentences sent to the tokenizer per call
+TOKENIZE_BATCH_SIZE = 2048
+
+_PARAGRAPH_BREAK_RE = re.compile(r"\n\s*\n")
+# End of sentence: ".", "!" or "?" followed by whitespace and an upper-case
+# letter / digit (optionally behind a quote or bracket)
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[]?[A-Z0-9])")
 
 
 def split_text_into_chunks(text: str, max_words: int = 200) -> List[str]:
@@ -52,33 +77,187 @@ def split_text_into_chunks(text: str, max_words: int = 200) -> List[str]:
     return chunks
 
 
-def chunk_pdf_pages_to_document_chunks(
-    doc_id: str,
-    page_texts: List[str],
-    max_words: int = 200,
-) -> List[DocumentChunk]:
+def split_sentences(text: str) -> List[str]:
     """
-    Take a list of page texts and return a list of DocumentChunk objects.
-    Each chunk knows which document and which page it came from.
+    Split text into sentences, with whitespace (incl. PDF line breaks) collapsed.
+    """
+    sentences: List[str] = []
+    for para in _PARAGRAPH_BREAK_RE.split(text):
+        para = " ".join(para.split())
+        if para:
+            sentences.extend(s for s in _SENTENCE_END_RE.split(para) if s)
+    return sentences
+
+
+def _check_chunk_sizes(max_tokens: int, overlap_tokens: int) -> None:
+    # The embedder adds [CLS] and [SEP], anything longer gets truncated
+    if not 0 < max_tokens <= TEXT_EMBEDDING_MAX_TOKENS - 2:
+        raise ValueError(f"max_tokens must be between 1 and {TEXT_EMBEDDING_MAX_TOKENS - 2}.")
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("overlap_tokens must be >= 0 and smaller than max_tokens.")
+
+
+def _split_long_sentence(
+    sentence: str,
+    offsets: Sequence[Tuple[int, int]],
+    max_tokens: int,
+    overlap_tokens: int,
+) -> List[Tuple[str, int]]:
+    # Windows of max_tokens tokens (overlapping by overlap_tokens), cut at token boundaries
+    pieces = []
+    step = max_tokens - overlap_tokens
+    for start in range(0, len(offsets), step):
+        window = offsets[start:start + max_tokens]
+        pieces.append((sentence[window[0][0]:window[-1][1]], len(window)))
+        if start + max_tokens >= len(offsets):
+            break
+    return pieces
+
+
+def _pack_sentences(
+    pieces: List[Tuple[str, int]],
+    max_tokens: int,
+    overlap_tokens: int,
+) -> List[str]:
+    # Greedily fill chunks with (text, n_tokens) pieces, carrying the tail over as overlap
+    chunks: List[str] = []
+    current: List[Tuple[str, int]] = []
+    current_tokens = 0
+
+    for text, n_tokens in pieces:
+        if current and current_tokens + n_tokens > max_tokens:
+            chunks.append(" ".join(t for t, _ in current))
+
+            # Overlap: trailing pieces of the chunk just closed, never the whole chunk
+            carried: List[Tuple[str, int]] = []
+            carried_tokens = 0
+            for piece in reversed(current[1:]):
+                if carried_tokens + piece[1] > overlap_tokens:
+                    break
+                carried.insert(0, piece)
+                carried_tokens += piece[1]
+            while carried and carried_tokens + n_tokens > max_tokens:
+                carried_tokens -= carried.pop(0)[1]
+            current, current_tokens = carried, carried_tokens
+
+        current.append((text, n_tokens))
+        current_tokens += n_tokens
+
+    if current:
+        chunks.append(" ".join(t for t, _ in current))
+    return chunks
+
+
+def split_pages_into_token_chunks(
+    page_texts: Sequence[str],
+    max_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    tokenizer=None,
+) -> List[List[str]]:
+    """
+    Token-aware chunking of many pages at once (see module docstring).
+    Returns one list of chunk texts per page.
+
+    `tokenizer` is any Hugging Face fast tokenizer (defaults to the
+    embedding model's); it must support return_offsets_mapping.
     """
+    _check_chunk_sizes(max_tokens, overlap_tokens)
+    tokenizer = tokenizer or get_text_tokenizer()
+
+    page_sentences = [split_sentences(text) for text in page_texts]
+    flat = [sentence for sentences in page_sentences for sentence in sentences]
 
-    all_chunks: List[DocumentChunk] = []
+    # Token offsets of every sentence, in batched tokenizer calls
+    offsets: List[Sequence[Tuple[int, int]]] = []
+    for start in range(0, len(flat), TOKENIZE_BATCH_SIZE):
+        encoded = tokenizer(
+            flat[start:start + TOKENIZE_BATCH_SIZE],
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+        )
+        offsets.extend(encoded["offset_mapping"])
 
-    for page_index, page_text in enumerate(page_texts):
-        page_number = page_index + 1  # 1-based
+    page_chunks: List[List[str]] = []
+    position = 0
+    for sentences in page_sentences:
+        pieces: List[Tuple[str, int]] = []
+        for sentence in sentences:
+            sentence_offsets = offsets[position]
+            position += 1
+            if len(sentence_offsets) > max_tokens:
+                pieces.extend(_split_long_sentence(sentence, sentence_offsets, max_tokens, overlap_tokens))
+            elif sentence_offsets:
+                pieces.append((sentence, len(sentence_offsets)))
+        page_chunks.append(_pack_sentences(pieces, max_tokens, overlap_tokens))
+    return page_chunks
 
-        # Get text chunks for this page
-        text_chunks = split_text_into_chunks(page_text, max_words=max_words)
 
-        for chunk_text in text_chunks:
+def chunk_pages(
+    doc_id: str,
+    pages: Sequence[Tuple[int, str]],
+    max_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    make_id: Optional[ChunkIdAllocator] = None,
+    tokenizer=None,
+) -> List[DocumentChunk]:
+    """
+    Chunk several pages, given as (1-based page_number, page_text) pairs,
+    into DocumentChunk objects, with one batched tokenizer pass.
+    Pass the same `make_id` for every page of a document so repeated
+    chunks get distinct ids.
+    """
+    make_id = make_id or ChunkIdAllocator()
+    chunks: List[DocumentChunk] = []
+
+    with span("chunking", items=len(pages)):
+        page_chunks = split_pages_into_token_chunks(
+            [text for _, text in pages], max_tokens=max_tokens, overlap_tokens=overlap_tokens, tokenizer=tokenizer
+        )
+    for (page_number, _), chunk_texts in zip(pages, page_chunks):
+        for chunk_text in chunk_texts:
             chunk = DocumentChunk(
-                id=str(uuid.uuid4()),
+                id=make_id(doc_id, "text", page_number, chunk_text),
                 doc_id=doc_id,
                 modality="text",
                 page=page_number,
                 content=chunk_text,
                 extra=None,
             )
-            all_chunks.append(chunk)
+            chunks.append(chunk)
+
+    return chunks
+
+
+def chunk_page_text(
+    doc_id: str,
+    page_number: int,
+    page_text: str,
+    max_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    make_id: Optional[ChunkIdAllocator] = None,
+    tokenizer=None,
+) -> List[DocumentChunk]:
+    """
+    Chunk the text of a single page (1-based page_number) into DocumentChunk objects.
+    Prefer chunk_pages for many pages (one tokenizer call for all of them).
+    """
+    return chunk_pages(
+        doc_id, [(page_number, page_text)], max_tokens=max_tokens,
+        overlap_tokens=overlap_tokens, make_id=make_id, tokenizer=tokenizer,
+    )
 
-    return all_chunks
+
+def chunk_pdf_pages_to_document_chunks(
+    doc_id: str,
+    page_texts: List[str],
+    max_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+) -> List[DocumentChunk]:
+    """
+    Take a list of page texts and return a list of DocumentChunk objects.
+    Each chunk knows which document and which page it came from.
+    Chunk ids are derived from the content, so they are stable across runs.
+    """
+    pages = [(page_index + 1, page_text) for page_index, page_text in enumerate(page_texts)]  # 1-based
+    return chunk_pages(doc_id, pages, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
@@ -4,35 +4,304 @@ We use sentence-transformers here.
 
 This file exposes:
 - get_text_embedding_model()
-- embed_texts(texts)
+- set_text_embedding_model(model, model_name)  (e.g. a stub for offline benchmarks)
+- configure_text_embeddings(backend, num_threads, token_budget)
+- get_text_embedding_backend()
+- get_text_tokenizer()
+- embed_texts(texts)  -> float32 array (N, D)
+- get_embedding_cache_stats()
+
+embed_texts goes through an on-disk cache (app/embedding_cache.py),
+so only texts that were never embedded before reach the model.
+
+Batching: inputs are sorted by token length and cut into batches of at
+most EMBED_TOKEN_BUDGET padded tokens, so a short OCR snippet is never
+padded to the length of a full text chunk, and batches of short texts
+are large. Results come back in input order.
+
+Backends (configure_text_embeddings):
+- "torch":      sentence-transformers as is (default)
+- "torch-int8": same model with its Linear layers dynamically quantized
+                to int8 (CPU only, ~2x faster, near-identical vectors)
+- "onnx":       sentence-transformers' ONNX export run by onnxruntime
+                (needs `optimum` / `onnxruntime`, falls back to torch)
+num_threads sets the intra-op threads of torch / onnxruntime; lower it
+when OCR worker processes run alongside the embedder.
+The backend is part of the embedding cache keys and is recorded in
+saved indexes, since int8 / ONNX vectors differ slightly from torch ones.
 """
 
-from typing import List
+from typing import List, Dict, Optional, TYPE_CHECKING
+import threading
+
+import numpy as np
+
+from app.embedding_cache import get_embedding_cache, make_cache_key
+from app.tracing import span
+
+# Name of the sentence-transformers model used for all text embeddings.
+# Saved indexes record this name so a mismatched model can be rejected.
+TEXT_EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Longer inputs are truncated by the model (word pieces, incl. [CLS] / [SEP])
+TEXT_EMBEDDING_MAX_TOKENS = 256
+
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx")
+
+# Padded tokens per model call (batch size x longest input of the batch)
+EMBED_TOKEN_BUDGET = 16384
+EMBED_MAX_BATCH_SIZE = 256
 
-from sentence_transformers import SentenceTransformer
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
 
-# We'll load the model lazily (only when needed)
+# We'll load the model lazily (only when needed).
+# sentence_transformers itself (and torch) is only imported then too.
 _text_model = None
+_text_model_lock = threading.Lock()
+_text_tokenizer = None
 
+# Name recorded in indexes and cache keys; only differs from
+# TEXT_EMBEDDING_MODEL_NAME after set_text_embedding_model
+_text_model_name = TEXT_EMBEDDING_MODEL_NAME
+_disk_cache_enabled = True
 
-def get_text_embedding_model() -> SentenceTransformer:
+# Set with configure_text_embeddings
+_backend = "torch"
+_num_threads: Optional[int] = None
+_token_budget = EMBED_TOKEN_BUDGET
+
+
+def get_text_embedding_model() -> "SentenceTransformer":
     """
     Returns a singleton SentenceTransformer model.
     Downloads the model the first time you call it.
     """
     global _text_model
     if _text_model is None:
-        # Small, fast model (enough for assignment)
-        _text_model = SentenceTransformer("all-MiniLM-L6-v2")
+        with _text_model_lock:
+            if _text_model is None:
+                _text_model = _load_text_embedding_model(_backend, _num_threads)
     return _text_model
 
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
+def _load_text_embedding_model(backend: str, num_threads: Optional[int]) -> "SentenceTransformer":
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        try:
+            model_kwargs = {"provider": "CPUExecutionProvider"}
+            if num_threads:
+                import onnxruntime
+
+                options = onnxruntime.SessionOptions()
+                options.intra_op_num_threads = num_threads
+                model_kwargs["session_options"] = options
+            return SentenceTransformer(
+                TEXT_EMBEDDING_MODEL_NAME, device="cpu", backend="onnx", model_kwargs=model_kwargs
+            )
+        except (ImportError, TypeError, ValueError) as e:
+            print(f"[WARN] ONNX embedding backend not available ({e}), using torch.")
+            backend = "torch"
+            # Cache keys and index headers must name what actually runs
+            global _backend
+            _backend = backend
+
+    if num_threads:
+        import torch
+
+        # Process-wide setting, shared with anything else using torch
+        torch.set_num_threads(num_threads)
+
+    # Small, fast model (enough for assignment)
+    if backend == "torch-int8":
+        import torch
+
+        model = SentenceTransformer(TEXT_EMBEDDING_MODEL_NAME, device="cpu")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return SentenceTransformer(TEXT_EMBEDDING_MODEL_NAME)
+
+
+def configure_text_embeddings(
+    backend: Optional[str] = None,
+    num_threads: Optional[int] = None,
+    token_budget: Optional[int] = None,
+) -> None:
     """
-    Takes a list of strings and returns a list of embeddings (vectors).
-    Each embedding is a list of floats.
+    Choose the embedding backend (see module docstring), the number of
+    intra-op threads and the padded-token budget per batch. Arguments left
+    to None keep their current value. Changing the backend or the threads
+    drops the loaded model; it is reloaded on next use.
     """
+    global _text_model, _backend, _num_threads, _token_budget
+    if backend is not None and backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}.")
+    if num_threads is not None and num_threads < 1:
+        raise ValueError("num_threads must be at least 1.")
+    if token_budget is not None and token_budget < TEXT_EMBEDDING_MAX_TOKENS:
+        raise ValueError(f"token_budget must be at least {TEXT_EMBEDDING_MAX_TOKENS}.")
+
+    with _text_model_lock:
+        if (backend or _backend) != _backend or (num_threads or _num_threads) != _num_threads:
+            # A custom model (set_text_embedding_model) is kept as is
+            if _text_model_name == TEXT_EMBEDDING_MODEL_NAME:
+                _text_model = None
+        _backend = backend or _backend
+        _num_threads = num_threads or _num_threads
+        _token_budget = token_budget or _token_budget
+
+
+def set_text_embedding_model(model, model_name: str, use_disk_cache: bool = False) -> None:
+    """
+    Use `model` instead of the sentence-transformers model. Any object with
+    encode(texts, batch_size=..., show_progress_bar=False) -> (N, D) array
+    works, e.g. the deterministic stub embedder of the offline benchmarks.
+    If it has a `tokenizer` attribute, batches are sized by its token
+    counts, otherwise by an estimate from the text length.
+
+    `model_name` is recorded in new indexes and keys the caches, so vectors
+    of different models never mix. The on-disk embedding cache is skipped
+    unless use_disk_cache=True.
+    """
+    global _text_model, _text_model_name, _disk_cache_enabled
+    with _text_model_lock:
+        _text_model = model
+        _text_model_name = model_name
+        _disk_cache_enabled = use_disk_cache
+
+
+def get_text_embedding_model_name() -> str:
+    """
+    Name of the embedding model currently in use.
+    """
+    return _text_model_name
+
+
+def get_text_embedding_backend() -> str:
+    """
+    Backend computing the embeddings: one of EMBEDDING_BACKENDS, or
+    "custom" for a model given to set_text_embedding_model.
+    """
+    return _backend if _text_model_name == TEXT_EMBEDDING_MODEL_NAME else "custom"
+
+
+def _cache_model_key() -> str:
+    # Model + backend: int8 / ONNX vectors never mix with torch ones
+    return f"{_text_model_name}@{get_text_embedding_backend()}"
+
+
+def get_text_tokenizer():
+    """
+    Returns the (fast) tokenizer of the embedding model, as a singleton.
+    Loaded on its own through transformers, without the model weights,
+    so chunking doesn't have to load the embedding model.
+    """
+    global _text_tokenizer
+    if _text_tokenizer is None:
+        with _text_model_lock:
+            if _text_tokenizer is None:
+                from transformers import AutoTokenizer
+
+                _text_tokenizer = AutoTokenizer.from_pretrained(
+                    f"sentence-transformers/{TEXT_EMBEDDING_MODEL_NAME}", use_fast=True
+                )
+    return _text_tokenizer
+
+
+def is_text_embedding_model_loaded() -> bool:
+    """
+    True once the embedding model has been loaded (no loading triggered).
+    """
+    return _text_model is not None
+
+
+def _token_lengths(model, texts: List[str]) -> np.ndarray:
+    """
+    Number of tokens the model will see for each text (after truncation).
+    """
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        # ~4 characters per word piece, plus [CLS] / [SEP]
+        lengths = np.fromiter((len(t) // 4 + 2 for t in texts), dtype=np.int64, count=len(texts))
+    else:
+        encoded = tokenizer(
+            texts, truncation=True, max_length=TEXT_EMBEDDING_MAX_TOKENS,
+            return_attention_mask=False, return_token_type_ids=False,
+        )
+        lengths = np.fromiter((len(ids) for ids in encoded["input_ids"]), dtype=np.int64, count=len(texts))
+    return np.minimum(lengths, TEXT_EMBEDDING_MAX_TOKENS)
+
+
+def _length_bucketed_batches(
+    lengths: np.ndarray,
+    token_budget: int = EMBED_TOKEN_BUDGET,
+    max_batch_size: int = EMBED_MAX_BATCH_SIZE,
+) -> List[np.ndarray]:
+    """
+    Positions of the inputs grouped into batches, longest inputs first.
+    Each batch holds at most token_budget // (its longest input) inputs,
+    so every batch pads to roughly the same number of tokens.
+    """
+    order = np.argsort(-lengths, kind="stable")
+    batches: List[np.ndarray] = []
+    start = 0
+    while start < len(order):
+        longest = max(int(lengths[order[start]]), 1)
+        size = max(1, min(max_batch_size, token_budget // longest))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+def _encode(texts: List[str]) -> np.ndarray:
     model = get_text_embedding_model()
-    embeddings = model.encode(texts, show_progress_bar=False)
-    # Convert numpy array → Python lists for simplicity
-    return embeddings.tolist()
+    with span("embed", items=len(texts)):
+        embeddings: Optional[np.ndarray] = None
+        for positions in _length_bucketed_batches(_token_lengths(model, texts), _token_budget):
+            batch = [texts[i] for i in positions]
+            vectors = np.asarray(model.encode(batch, batch_size=len(batch), show_progress_bar=False), dtype="float32")
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype="float32")
+            # Back to input order
+            embeddings[positions] = vectors
+    return embeddings if embeddings is not None else np.zeros((0, 0), dtype="float32")
+
+
+def embed_texts(texts: List[str], use_cache: bool = True) -> np.ndarray:
+    """
+    Takes a list of strings and returns their embeddings as a float32
+    array of shape (N, D), in input order.
+
+    With use_cache=True, cached vectors are reused and only the
+    cache misses are sent to the model (each unique text once).
+    """
+    if not use_cache or not _disk_cache_enabled or not texts:
+        return _encode(texts)
+
+    cache = get_embedding_cache()
+    keys = [make_cache_key(_cache_model_key(), t) for t in texts]
+    vectors = cache.get_many(keys)
+
+    # One model call for all misses, each distinct text only once
+    missing: Dict[str, str] = {}
+    for key, text in zip(keys, texts):
+        if key not in vectors and key not in missing:
+            missing[key] = text
+
+    if missing:
+        new_vectors = _encode(list(missing.values()))
+        vectors.update(zip(missing.keys(), new_vectors))
+        # Keyed again: loading the model may have fallen back to another backend
+        cache.put_many({
+            make_cache_key(_cache_model_key(), text): vector
+            for text, vector in zip(missing.values(), new_vectors)
+        })
+
+    return np.stack([vectors[key] for key in keys]).astype("float32", copy=False)
+
+
+def get_embedding_cache_stats() -> Dict[str, float]:
+    """
+    Hits, misses, hit rate, evictions and size of the embedding cache.
+    """
+    return get_embedding_cache().stats()
@@ -0,0 +1,303 @@
+"""
+Evaluation harness: retrieval quality, answer keywords and per-stage latency.
+
+Each question goes through two stages, and each stage is cached on disk
+(SQLite in data/processed/eval_cache.sqlite):
+- retrieval:  key = (index version, question, retrieval config)
+              value = retrieved chunk ids + scores
+- generation: key = (index version, question, LLM name, prompt)
+              value = answer text
+
+Rerunning after a prompt or generation tweak therefore only redoes
+generation; rerunning with another top_k / mode only redoes what depends
+on it. The index version changes whenever the index does, so stale
+results are never reused.
+
+Questions are dicts like eval_rag.EVAL_QUESTIONS:
+    {"id": ..., "question": ..., "expected_keywords": [...],
+     "relevant_pages": [...]}        # optional
+
+Retrieval metrics per question:
+- with "relevant_pages": recall@k = share of relevant pages among the
+  retrieved chunks' pages, MRR = 1 / rank of the first chunk on one of them
+- otherwise keyword-based: recall@k = share of expected keywords found in
+  the retrieved chunks, MRR = 1 / rank of the first chunk containing one
+
+Latency percentiles (p50 / p95) only count stages that actually ran,
+cache hits are reported separately. Generation runs in batches, so a
+question's generation time is its batch's time divided by the batch size.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from app.config import PROCESSED_DIR
+from app.index import search_text_index, resolve_search_mode, get_chunks_by_ids, get_index_version
+from app.models import DocumentChunk
+from app.tracing import span
+from app.qa_pipeline import (
+    build_prompt,
+    format_context_for_prompt,
+    get_local_llm,
+    LOCAL_LLM_MODEL_NAME,
+    NO_CONTEXT_ANSWER,
+)
+
+EVAL_CACHE_PATH = Path(PROCESSED_DIR) / "eval_cache.sqlite"
+
+# Questions retrieved concurrently; search releases the GIL in NumPy,
+# and every worker shares the same index
+DEFAULT_EVAL_WORKERS = min(4, os.cpu_count() or 1)
+
+# Prompts per model call when generating (as in answer_questions)
+DEFAULT_GENERATION_BATCH_SIZE = 8
+
+STAGES = ("retrieval", "generation")
+
+
+def _hash_key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class EvalCache:
+    """
+    (stage, key) -> JSON value, in SQLite. Safe to share between threads.
+    """
+
+    def __init__(self, path: Path = EVAL_CACHE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " stage TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " PRIMARY KEY (stage, key))"
+        )
+        self._conn.commit()
+
+    def get(self, stage: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM results WHERE stage = ? AND key = ?", (stage, key)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, stage: str, key: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (stage, key, value) VALUES (?, ?, ?)",
+                (stage, key, json.dumps(value)),
+            )
+            self._conn.commit()
+
+    def clear(self, stage: Optional[str] = None) -> None:
+        with self._lock:
+            if stage is None:
+                self._conn.execute("DELETE FROM results")
+            else:
+                self._conn.execute("DELETE FROM results WHERE stage = ?", (stage,))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def retrieval_metrics(item: Dict[str, Any], chunks: List[DocumentChunk]) -> Dict[str, float]:
+    """
+    recall@k and reciprocal rank of one question (see module docstring).
+    """
+    relevant_pages = item.get("relevant_pages")
+    if relevant_pages:
+        relevant = set(relevant_pages)
+        found = {ch.page for ch in chunks} & relevant
+        ranks = [rank for rank, ch in enumerate(chunks, start=1) if ch.page in relevant]
+        recall = len(found) / len(relevant)
+    else:
+        keywords = [kw.lower() for kw in item.get("expected_keywords", [])]
+        if not keywords:
+            return {"recall": 1.0, "reciprocal_rank": 1.0}
+        texts = [ch.content.lower() for ch in chunks]
+        recall = sum(any(kw in text for text in texts) for kw in keywords) / len(keywords)
+        ranks = [rank for rank, text in enumerate(texts, start=1) if any(kw in text for kw in keywords)]
+    return {"recall": recall, "reciprocal_rank": 1.0 / ranks[0] if ranks else 0.0}
+
+
+def keyword_hits(item: Dict[str, Any], answer: str) -> List[str]:
+    answer_lower = answer.lower()
+    return [kw for kw in item.get("expected_keywords", []) if kw.lower() in answer_lower]
+
+
+def _retrieve_one(
+    index: Dict[str, Any],
+    item: Dict[str, Any],
+    config: Dict[str, Any],
+    cache: Optional[EvalCache],
+) -> Dict[str, Any]:
+    question = item["question"]
+    result: Dict[str, Any] = {"id": item.get("id"), "question": question, "seconds": {}, "cached": {}}
+
+    # Retrieved chunk ids + scores; the index version pins the chunks
+    retrieval_key = _hash_key(get_index_version(index), question, config)
+    hits = cache.get("retrieval", retrieval_key) if cache else None
+    result["cached"]["retrieval"] = hits is not None
+    if hits is None:
+        start = time.perf_counter()
+        results = search_text_index(index, question, **config)
+        result["seconds"]["retrieval"] = time.perf_counter() - start
+        hits = [[float(score), chunk.id] for score, chunk in results]
+        if cache:
+            cache.put("retrieval", retrieval_key, hits)
+    chunks = get_chunks_by_ids(index, [chunk_id for _, chunk_id in hits])
+    result["chunks"] = chunks
+    result["scores"] = [score for score, _ in hits]
+    result.update(retrieval_metrics(item, chunks))
+    return result
+
+
+def _generate_answers(
+    index: Dict[str, Any],
+    items: List[Dict[str, Any]],
+    results: List[Dict[str, Any]],
+    cache: Optional[EvalCache],
+    batch_size: int,
+) -> None:
+    # Fills in "answer", "keyword_hits" and "passed" of each result.
+    # Cache misses are generated like answer_questions does: prompts sorted
+    # by length, `batch_size` per model call. The seconds of a batch are
+    # split evenly between its questions.
+    todo: List[Tuple[str, str, Dict[str, Any]]] = []  # (key, prompt, result)
+    for result in results:
+        result["cached"]["generation"] = False
+        if not result["chunks"]:
+            result["answer"] = NO_CONTEXT_ANSWER
+            continue
+        prompt = build_prompt(format_context_for_prompt(result["chunks"]), result["question"])
+        generation_key = _hash_key(get_index_version(index), result["question"], LOCAL_LLM_MODEL_NAME, prompt)
+        answer = cache.get("generation", generation_key) if cache else None
+        if answer is not None:
+            result["answer"] = answer
+            result["cached"]["generation"] = True
+        else:
+            todo.append((generation_key, prompt, result))
+
+    todo.sort(key=lambda entry: len(entry[1]))
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start:start + batch_size]
+        llm = get_local_llm()
+        batch_start = time.perf_counter()
+        with span("generation", items=len(batch)):
+            outputs = llm([prompt for _, prompt, _ in batch], batch_size=len(batch))
+        seconds = (time.perf_counter() - batch_start) / len(batch)
+        for (generation_key, _, result), output in zip(batch, outputs):
+            # The pipeline returns a list per input when given a list
+            if isinstance(output, list):
+                output = output[0]
+            result["answer"] = output["generated_text"].strip()
+            result["seconds"]["generation"] = seconds
+            if cache:
+                cache.put("generation", generation_key, result["answer"])
+
+    for item, result in zip(items, results):
+        result["keyword_hits"] = keyword_hits(item, result["answer"])
+        result["passed"] = bool(result["keyword_hits"]) or not item.get("expected_keywords")
+
+
+def _latency_summary(results: List[Dict[str, Any]], stage: str) -> Dict[str, Any]:
+    seconds = np.array([r["seconds"][stage] for r in results if stage in r["seconds"]])
+    summary: Dict[str, Any] = {
+        "computed": int(seconds.size),
+        "cached": sum(1 for r in results if r["cached"].get(stage)),
+    }
+    if seconds.size:
+        summary["p50_s"] = float(np.percentile(seconds, 50))
+        summary["p95_s"] = float(np.percentile(seconds, 95))
+    return summary
+
+
+def evaluate_questions(
+    index: Dict[str, Any],
+    items: List[Dict[str, Any]],
+    top_k: int = 5,
+    mode: str = "dense",
+    doc_ids: Optional[List[str]] = None,
+    modalities: Optional[List[str]] = None,
+    page_range: Optional[Tuple[int, int]] = None,
+    workers: int = DEFAULT_EVAL_WORKERS,
+    batch_size: int = DEFAULT_GENERATION_BATCH_SIZE,
+    use_cache: bool = True,
+    generate: bool = True,
+    cache_path: Path = EVAL_CACHE_PATH,
+) -> Dict[str, Any]:
+    """
+    Evaluate a question set on `index`: retrieval runs `workers`
+    questions at a time, then the answers are generated on this thread
+    in batches of `batch_size`.
+    With generate=False only retrieval is run (and scored).
+
+    Returns {"results": [per question, in input order], "summary": {...}}:
+    summary has recall_at_k, mrr, keyword_pass_rate (with generation),
+    and per stage {computed, cached, p50_s, p95_s}.
+    """
+    config = {
+        "top_k": top_k,
+        "mode": resolve_search_mode(mode),
+        "doc_ids": sorted(set(doc_ids)) if doc_ids is not None else None,
+        "modalities": sorted(set(modalities)) if modalities is not None else None,
+        "page_range": tuple(page_range) if page_range is not None else None,
+    }
+    cache = EvalCache(cache_path) if use_cache else None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            results = list(pool.map(lambda item: _retrieve_one(index, item, config, cache), items))
+        if generate:
+            _generate_answers(index, items, results, cache, max(1, batch_size))
+    finally:
+        if cache:
+            cache.close()
+
+    summary: Dict[str, Any] = {
+        "questions": len(results),
+        "top_k": top_k,
+        "mode": config["mode"],
+        "recall_at_k": float(np.mean([r["recall"] for r in results])) if results else 0.0,
+        "mrr": float(np.mean([r["reciprocal_rank"] for r in results])) if results else 0.0,
+        "latency": {stage: _latency_summary(results, stage) for stage in STAGES if generate or stage == "retrieval"},
+    }
+    if generate:
+        passed = sum(1 for r in results if r["passed"])
+        summary["keyword_pass_rate"] = passed / len(results) if results else 0.0
+    return {"results": results, "summary": summary}
+
+
+def format_eval_summary(summary: Dict[str, Any]) -> str:
+    """
+    Console table of evaluate_questions' summary.
+    """
+    lines = [
+        f"Questions: {summary['questions']} | mode={summary['mode']} | top_k={summary['top_k']}",
+        f"recall@{summary['top_k']}: {summary['recall_at_k']:.3f}",
+        f"MRR:       {summary['mrr']:.3f}",
+    ]
+    if "keyword_pass_rate" in summary:
+        lines.append(f"Answer keyword pass rate: {summary['keyword_pass_rate'] * 100:.1f}%")
+    lines.append(f"{'stage':<12}{'computed':>10}{'cached':>8}{'p50 s':>9}{'p95 s':>9}")
+    for stage, latency in summary["latency"].items():
+        p50 = f"{latency['p50_s']:.3f}" if "p50_s" in latency else "-"
+        p95 = f"{latency['p95_s']:.3f}" if "p95_s" in latency else "-"
+        lines.append(f"{stage:<12}{latency['computed']:>10}{latency['cached']:>8}{p50:>9}{p95:>9}")
+    return "\n".join(lines)
@@ -4,80 +4,1251 @@ Simple in-memory vector index for text chunks.
 STEP 5:
 - Build an index from a list of DocumentChunk objects.
 - Search the index using cosine similarity.
+
+Embeddings are L2-normalized once at build time, so cosine similarity
+is just a dot product at query time.
+
+Saved indexes live under data/indexes/<name>/, one folder per save
+(<name>/v-<id>/) and a CURRENT file naming the one to load:
+- header.json     -> format version, model name, dimension, number of chunks
+- embeddings.f32  -> raw float32 matrix (N, D), opened with np.memmap
+- chunks_*        -> columnar chunk store (see app/chunk_store.py), memory-mapped
+- ivf_*.npy       -> IVF centroids / list assignments (only for backend="ivf")
+- quantized_*.npy -> compact float16 / int8 copy of the embeddings (only for storage != "float32")
+- lexical_*       -> BM25 postings (see app/lexical.py), memory-mapped
+
+A save never touches the files of an index that is already loaded (and
+memory-mapped); older version folders are removed on later saves.
+
+Indexes can be updated in place (add_chunks_to_index, delete_doc_from_index,
+replace_doc_in_index). Deleted rows are only tombstoned; compact_index drops
+them for real, and runs automatically once enough rows are dead.
+
+Backends:
+- "exact": brute-force cosine over every row (default)
+- "ivf":   approximate search over the closest lists only (see app/ann.py)
+
+Search modes:
+- "dense":   cosine over the embeddings (default)
+- "lexical": BM25 over the chunk texts (see app/lexical.py), no embedder needed
+- "hybrid":  dense and BM25 rankings fused with reciprocal rank fusion
+- "auto":    "hybrid" once the embedding model is loaded, "lexical" before
+
+Storage (see app/quantization.py):
+- "float32": score with the full-precision matrix (default)
+- "float16" / "int8": score with a compact copy kept in RAM, then rescore
+  the best few candidates with the float32 matrix
 """
 
-from typing import List, Tuple, Dict, Any
+from pathlib import Path
+from typing import List, Tuple, Dict, Any, Optional, Iterable
+import copy
+import json
+import os
+import shutil
+import uuid
 
 import numpy as np
 
+from app.config import INDEXES_DIR
 from app.models import DocumentChunk
-from app.embeddings import embed_texts
+from app.chunk_store import ChunkStore, MODALITIES
+from app.embeddings import (
+    embed_texts,
+    is_text_embedding_model_loaded,
+    get_text_embedding_model_name,
+    get_text_embedding_backend,
+    TEXT_EMBEDDING_MODEL_NAME,
+)
+from app.lexical import (
+    build_lexical_index,
+    update_lexical_index,
+    select_lexical_rows,
+    save_lexical_index,
+    load_lexical_index,
+    bm25_scores,
+)
+from app.utils import iter_batches, prefetch, LRUCache
+from app.tracing import span
+from app.ann import build_ivf, build_list_layout, ivf_candidates, assign_to_lists, DEFAULT_NPROBE
+from app.quantization import (
+    quantize,
+    approximate_scores,
+    quantized_nbytes,
+    STORAGE_MODES,
+    RESCORE_FACTOR,
+)
+
+# Bump this whenever the on-disk layout changes.
+# v2: embeddings are stored L2-normalized.
+# v3: chunks are stored column-wise (ChunkStore) instead of JSON lines.
+INDEX_FORMAT_VERSION = 3
+
+HEADER_FILE = "header.json"
+CURRENT_FILE = "CURRENT"
+EMBEDDINGS_FILE = "embeddings.f32"
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_ASSIGNMENTS_FILE = "ivf_assignments.npy"
+QUANTIZED_CODES_FILE = "quantized_codes.npy"
+QUANTIZED_SCALE_FILE = "quantized_scale.npy"
+
+INDEX_BACKENDS = ("exact", "ivf")
+SEARCH_MODES = ("dense", "lexical", "hybrid", "auto")
+
+# Reciprocal rank fusion: score = sum over rankings of 1 / (RRF_K + rank)
+RRF_K = 60
+# Candidates taken from each ranking before fusing (at least top_k)
+HYBRID_CANDIDATES = 50
+
+# Max queries scored together in search_text_index_batch,
+# bounds the (Q, N) score matrix for large indexes.
+QUERY_BLOCK_SIZE = 64
+
+# Recently seen query strings -> normalized query embedding
+QUERY_EMBEDDING_CACHE_SIZE = 4096
+_query_embedding_cache = LRUCache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+
+# Filters matching at most this many rows are searched exactly, even on IVF indexes
+FILTERED_EXACT_MAX_ROWS = 50_000
+
+# Chunks embedded per model call when building from a stream
+EMBED_BATCH_SIZE = 256
+
+# Compact automatically once this fraction of rows is tombstoned
+COMPACTION_THRESHOLD = 0.2
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """
+    Returns a float32 copy of `matrix` with every row scaled to unit L2 norm.
+    All-zero rows are left as zeros.
+    """
+    matrix = np.asarray(matrix, dtype="float32")
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    # Avoid division by zero
+    norms = np.where(norms == 0, 1.0, norms)
+    return (matrix / norms).astype("float32", copy=False)
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Indices of the top_k highest scores, sorted by score (desc).
+    Uses argpartition, so only the top_k selected items get sorted.
+    """
+    n = scores.shape[0]
+    top_k = min(top_k, n)
+    if top_k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if top_k < n:
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(n)
+    order = np.argsort(-scores[candidates], kind="stable")
+    return candidates[order]
+
+
+def embed_queries(queries: List[str]) -> np.ndarray:
+    """
+    Embed all queries with a single model call.
+    Returns a normalized float32 matrix of shape (Q, D).
+
+    Recently seen queries come from an in-memory LRU cache; only the
+    others are sent to the model.
+    """
+    model_name = (get_text_embedding_model_name(), get_text_embedding_backend())
+    cached = [_query_embedding_cache.get((model_name, q)) for q in queries]
+    missing = list(dict.fromkeys(q for q, vec in zip(queries, cached) if vec is None))
+
+    if missing:
+        # Queries are rarely repeated verbatim across runs, keep them out of the disk cache
+        with span("query_embedding", items=len(missing)):
+            new_vectors = normalize_rows(embed_texts(missing, use_cache=False))
+        computed = dict(zip(missing, new_vectors))
+        for q, vec in computed.items():
+            _query_embedding_cache.put((model_name, q), vec)
+        cached = [vec if vec is not None else computed[q] for q, vec in zip(queries, cached)]
+
+    return np.stack(cached).astype("float32", copy=False)
+
+
+def get_query_embedding_cache_stats() -> Dict[str, float]:
+    """
+    Hits, misses and size of the query embedding LRU cache.
+    """
+    return _query_embedding_cache.stats()
 
 
-def build_text_index(chunks: List[DocumentChunk]) -> Dict[str, Any]:
+def build_text_index(
+    chunks: List[DocumentChunk],
+    backend: str = "exact",
+    n_lists: Optional[int] = None,
+    nprobe: int = DEFAULT_NPROBE,
+    storage: str = "float32",
+) -> Dict[str, Any]:
     """
     Given a list of DocumentChunk objects (text modality),
     compute embeddings and return an index object:
 
     {
-      "embeddings": np.ndarray of shape (N, D),
-      "chunks": List[DocumentChunk]
+      "embeddings": np.ndarray of shape (N, D), rows L2-normalized,
+      "chunks": ChunkStore (behaves like a read-only List[DocumentChunk]),
+      "deleted": np.ndarray of shape (N,), True for tombstoned rows,
+      "model_name": name of the embedding model used,
+      "embedding_backend": "torch", "torch-int8", "onnx" or "custom" (see app/embeddings.py),
+      "version": random id, changes every time the index is modified,
+      "backend": "exact" or "ivf",
+      "ivf": IVF structure (only for backend="ivf"),
+      "quantized": compact copy of the embeddings (only for storage != "float32"),
+      "lexical": BM25 index over the chunk texts (built on the first lexical /
+                 hybrid search, then updated along with the index)
     }
+
+    For backend="ivf", n_lists and nprobe control the recall/latency
+    trade-off (see app/ann.py). storage="float16" or "int8" adds a compact
+    copy of the embeddings that search scores first (see app/quantization.py).
     """
+    _check_build_options(backend, storage)
+
     if not chunks:
         raise ValueError("No chunks provided to build_text_index.")
 
     texts = [c.content for c in chunks]
-    embeddings_list = embed_texts(texts)  # List[List[float]]
+    # Normalize once here so search never has to recompute norms
+    embedding_matrix = normalize_rows(embed_texts(texts))  # shape: (N, D)
+
+    return _new_index(embedding_matrix, ChunkStore.from_chunks(chunks), backend, n_lists, nprobe, storage)
+
+
+def build_text_index_from_stream(
+    chunks: Iterable[DocumentChunk],
+    batch_size: int = EMBED_BATCH_SIZE,
+    backend: str = "exact",
+    n_lists: Optional[int] = None,
+    nprobe: int = DEFAULT_NPROBE,
+    storage: str = "float32",
+) -> Dict[str, Any]:
+    """
+    Same as build_text_index, but takes any iterable of chunks
+    (e.g. app.ingestion.iter_pdf_chunks) and embeds them in batches of
+    `batch_size` as they arrive.
+
+    The producer runs on a background thread, so extracting the next
+    batch overlaps with embedding the current one, and only a couple of
+    batches are ever waiting in memory.
+    """
+    _check_build_options(backend, storage)
+
+    store_parts: List[ChunkStore] = []
+    parts: List[np.ndarray] = []
 
-    embedding_matrix = np.array(embeddings_list, dtype="float32")  # shape: (N, D)
+    for batch in prefetch(iter_batches(chunks, batch_size), max_pending=2):
+        parts.append(normalize_rows(embed_texts([c.content for c in batch])))
+        # Keep only the compact columns, not the DocumentChunk objects
+        store_parts.append(ChunkStore.from_chunks(batch))
 
+    if not parts:
+        raise ValueError("No chunks provided to build_text_index_from_stream.")
+
+    return _new_index(np.vstack(parts), ChunkStore.concat(store_parts), backend, n_lists, nprobe, storage)
+
+
+def _check_build_options(backend: str, storage: str) -> None:
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index backend '{backend}', expected one of {INDEX_BACKENDS}.")
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"Unknown embedding storage '{storage}', expected one of {STORAGE_MODES}.")
+
+
+def _new_index(
+    embedding_matrix: np.ndarray,
+    chunks: ChunkStore,
+    backend: str,
+    n_lists: Optional[int],
+    nprobe: int,
+    storage: str = "float32",
+) -> Dict[str, Any]:
     index = {
         "embeddings": embedding_matrix,
         "chunks": chunks,
+        "deleted": np.zeros(len(chunks), dtype=bool),
+        "model_name": get_text_embedding_model_name(),
+        "embedding_backend": get_text_embedding_backend(),
+        "version": uuid.uuid4().hex,
+        "backend": "exact",
+    }
+
+    if backend == "ivf":
+        attach_ivf_backend(index, n_lists=n_lists, nprobe=nprobe)
+    if storage != "float32":
+        attach_quantized_storage(index, storage)
+
+    return index
+
+
+def attach_ivf_backend(
+    index: Dict[str, Any],
+    n_lists: Optional[int] = None,
+    nprobe: int = DEFAULT_NPROBE,
+) -> Dict[str, Any]:
+    """
+    Switch an existing index (e.g. a loaded exact one) to the IVF backend.
+    No re-embedding is needed, only k-means over the stored vectors.
+    """
+    _check_index(index)
+    index["ivf"] = build_ivf(index["embeddings"], n_lists=n_lists, nprobe=nprobe)
+    index["backend"] = "ivf"
+    return index
+
+
+def attach_quantized_storage(index: Dict[str, Any], storage: str) -> Dict[str, Any]:
+    """
+    Add (or replace) the compact float16 / int8 copy of the embeddings
+    that search scores first. storage="float32" removes it again.
+    No re-embedding is needed.
+
+    The float32 matrix is still kept for rescoring; the RAM saving comes
+    from loaded indexes, where it is memory-mapped and only the rescored
+    rows are read.
+    """
+    _check_index(index)
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"Unknown embedding storage '{storage}', expected one of {STORAGE_MODES}.")
+
+    if storage == "float32":
+        index.pop("quantized", None)
+    else:
+        index["quantized"] = quantize(index["embeddings"], storage)
+    return index
+
+
+def _touch(index: Dict[str, Any]) -> None:
+    # New version id: anything cached against the old one is now stale
+    index["version"] = uuid.uuid4().hex
+    for key in ("doc_rows", "modality_rows", "page_order"):
+        index.pop(key, None)
+
+
+def _get_lexical(index: Dict[str, Any]) -> Dict[str, Any]:
+    # BM25 index over live rows, built lazily (dense-only indexes never pay for it)
+    if "lexical" not in index:
+        index["lexical"] = build_lexical_index(index["chunks"].contents(), deleted=_get_deleted(index))
+    return index["lexical"]
+
+
+def _update_lexical(index: Dict[str, Any], rows: Iterable[int] = ()) -> None:
+    # Re-tokenize only `rows` (new or revived) and drop postings of deleted rows.
+    # Nothing to do until a lexical search has built the BM25 index.
+    if "lexical" not in index:
+        return
+    rows = np.asarray(list(rows), dtype=np.int64)
+    texts = [index["chunks"].get_content(int(row)) for row in rows]
+    index["lexical"] = update_lexical_index(index["lexical"], rows, texts, _get_deleted(index))
+
+
+def _group_rows(codes: np.ndarray, n_values: int) -> List[np.ndarray]:
+    # Sorted row ids per code value (posting arrays), from one stable argsort
+    codes = np.asarray(codes)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(n_values + 1))
+    return [order[bounds[code]:bounds[code + 1]].astype(np.int64) for code in range(n_values)]
+
+
+def _get_doc_rows(index: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    # doc_id -> sorted row ids, built lazily and dropped whenever the index changes
+    if "doc_rows" not in index:
+        store: ChunkStore = index["chunks"]
+        index["doc_rows"] = {
+            doc_id: rows
+            for doc_id, rows in zip(store.doc_vocab, _group_rows(store.doc_codes, len(store.doc_vocab)))
+            if rows.size
+        }
+    return index["doc_rows"]
+
+
+def _get_modality_rows(index: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    # modality -> sorted row ids, same lifetime as doc_rows
+    if "modality_rows" not in index:
+        store: ChunkStore = index["chunks"]
+        index["modality_rows"] = dict(zip(MODALITIES, _group_rows(store.modality_codes, len(MODALITIES))))
+    return index["modality_rows"]
+
+
+def _get_page_order(index: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    # (rows sorted by page, their pages): a page range is then two searchsorted calls
+    if "page_order" not in index:
+        pages = np.asarray(index["chunks"].pages)
+        order = np.argsort(pages, kind="stable").astype(np.int64)
+        index["page_order"] = (order, pages[order])
+    return index["page_order"]
+
+
+def list_doc_ids(index: Dict[str, Any]) -> List[str]:
+    """
+    The doc_ids that still have live chunks in the index.
+    """
+    _check_index(index)
+    deleted = _get_deleted(index)
+    return sorted(
+        doc_id for doc_id, rows in _get_doc_rows(index).items()
+        if not deleted[rows].all()
+    )
+
+
+def _allowed_rows(
+    index: Dict[str, Any],
+    doc_ids: Optional[List[str]] = None,
+    modalities: Optional[List[str]] = None,
+    page_range: Optional[Tuple[int, int]] = None,
+) -> Optional[np.ndarray]:
+    """
+    Sorted live row ids matching every given filter, or None for "no filter":
+    - doc_ids:    chunk.doc_id in doc_ids
+    - modalities: chunk.modality in modalities
+    - page_range: first <= chunk.page <= last (inclusive)
+
+    Each filter is looked up in precomputed posting arrays (no scan over
+    the chunks), then the filters are intersected, smallest first.
+    """
+    if doc_ids is None and modalities is None and page_range is None:
+        return None
+
+    selections: List[np.ndarray] = []
+    if doc_ids is not None:
+        doc_rows = _get_doc_rows(index)
+        parts = [doc_rows[d] for d in set(doc_ids) if d in doc_rows]
+        selections.append(np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64))
+
+    if modalities is not None:
+        unknown = set(modalities) - set(MODALITIES)
+        if unknown:
+            raise ValueError(f"Unknown modalities {sorted(unknown)}, expected some of {MODALITIES}.")
+        modality_rows = _get_modality_rows(index)
+        parts = [modality_rows[m] for m in set(modalities)]
+        selections.append(np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64))
+
+    if page_range is not None:
+        first, last = page_range
+        order, sorted_pages = _get_page_order(index)
+        lo, hi = np.searchsorted(sorted_pages, [first, last + 1])
+        selections.append(np.sort(order[lo:hi]))
+
+    selections.sort(key=len)
+    rows = selections[0]
+    for other in selections[1:]:
+        if rows.size == 0:
+            break
+        rows = np.intersect1d(rows, other, assume_unique=True)
+
+    deleted = _get_deleted(index)
+    return rows[~deleted[rows]]
+
+
+def _get_deleted(index: Dict[str, Any]) -> np.ndarray:
+    if "deleted" not in index:
+        index["deleted"] = np.zeros(len(index["chunks"]), dtype=bool)
+    return index["deleted"]
+
+
+def _get_id_to_row(index: Dict[str, Any]) -> Dict[str, int]:
+    # chunk id -> row, built lazily and dropped whenever rows move
+    if "id_to_row" not in index:
+        index["id_to_row"] = {chunk_id: row for row, chunk_id in enumerate(index["chunks"].ids())}
+    return index["id_to_row"]
+
+
+def get_chunks_by_ids(index: Dict[str, Any], chunk_ids: List[str]) -> List[DocumentChunk]:
+    """
+    The chunks with these ids, in the given order. Unknown or deleted ids are skipped.
+    """
+    id_to_row = _get_id_to_row(index)
+    deleted = _get_deleted(index)
+    rows = [id_to_row.get(chunk_id) for chunk_id in chunk_ids]
+    return [index["chunks"][row] for row in rows if row is not None and not deleted[row]]
+
+
+def copy_index(index: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of an index that can be updated (add / replace / delete / compact)
+    while the original keeps serving searches, e.g. from another thread.
+
+    Cheap: the large arrays are shared, since updates replace them instead
+    of writing into them. Only what is modified in place (tombstones, the
+    id map, the ChunkStore object, the ivf / quantized dicts) is copied.
+    """
+    _check_index(index)
+    new_index = dict(index)
+    new_index["deleted"] = _get_deleted(index).copy()
+    new_index.pop("id_to_row", None)
+
+    chunks = copy.copy(index["chunks"])
+    chunks.doc_vocab = list(chunks.doc_vocab)
+    new_index["chunks"] = chunks
+
+    for key in ("ivf", "quantized"):
+        if key in index:
+            new_index[key] = dict(index[key])
+    return new_index
+
+
+def add_chunks_to_index(index: Dict[str, Any], chunks: List[DocumentChunk]) -> int:
+    """
+    Add new chunks to an existing index, embedding only those chunks.
+    Chunks whose id is already live in the index are skipped; tombstoned
+    rows with a matching id are revived instead of re-embedded.
+    Returns the number of chunks that were added or revived.
+    """
+    _check_index(index)
+
+    deleted = _get_deleted(index)
+    id_to_row = _get_id_to_row(index)
+
+    new_chunks: List[DocumentChunk] = []
+    new_ids = set()
+    revived_rows: List[int] = []
+    for chunk in chunks:
+        row = id_to_row.get(chunk.id)
+        if row is not None:
+            if deleted[row]:
+                deleted[row] = False
+                revived_rows.append(row)
+            continue
+        if chunk.id not in new_ids:
+            new_ids.add(chunk.id)
+            new_chunks.append(chunk)
+
+    if new_chunks:
+        new_embeddings = normalize_rows(embed_texts([c.content for c in new_chunks]))
+        first_row = len(index["chunks"])
+
+        # np.vstack also turns a read-only memmap into a normal in-memory array
+        index["embeddings"] = np.vstack([index["embeddings"], new_embeddings])
+        index["chunks"].extend(new_chunks)
+        index["deleted"] = np.concatenate([deleted, np.zeros(len(new_chunks), dtype=bool)])
+        if "quantized" in index:
+            quantized = index["quantized"]
+            # Same int8 scale as the existing rows, so old and new codes stay comparable
+            new_codes = quantize(new_embeddings, quantized["mode"], scale=quantized.get("scale"))["codes"]
+            quantized["codes"] = np.vstack([quantized["codes"], new_codes])
+        for offset, chunk in enumerate(new_chunks):
+            id_to_row[chunk.id] = first_row + offset
+
+        if index.get("backend", "exact") == "ivf":
+            ivf = index["ivf"]
+            new_assignments = assign_to_lists(ivf["centroids"], new_embeddings)
+            ivf["assignments"] = np.concatenate([ivf["assignments"], new_assignments])
+            ivf["list_ids"], ivf["list_offsets"] = build_list_layout(
+                ivf["assignments"], ivf["centroids"].shape[0]
+            )
+
+    if new_chunks or revived_rows:
+        new_rows = range(len(index["chunks"]) - len(new_chunks), len(index["chunks"]))
+        _update_lexical(index, revived_rows + list(new_rows))
+        _touch(index)
+    return len(new_chunks) + len(revived_rows)
+
+
+def delete_doc_from_index(index: Dict[str, Any], doc_id: str) -> int:
+    """
+    Tombstone every chunk of `doc_id`. The rows stay in memory (and are
+    skipped by search) until the index is compacted.
+    Returns the number of rows that were deleted.
+    """
+    _check_index(index)
+
+    deleted = _get_deleted(index)
+    rows = _get_doc_rows(index).get(doc_id, np.zeros(0, dtype=np.int64))
+    rows = rows[~deleted[rows]]
+    if rows.size == 0:
+        return 0
+
+    deleted[rows] = True
+    _update_lexical(index)
+    _touch(index)
+    _maybe_compact(index)
+    return int(rows.size)
+
+
+def replace_doc_in_index(
+    index: Dict[str, Any],
+    doc_id: str,
+    chunks: List[DocumentChunk],
+) -> Dict[str, int]:
+    """
+    Replace the chunks of `doc_id` with a new version of the document.
+    Chunks that did not change (same content-derived id) keep their
+    embeddings; only new or modified chunks are embedded.
+    Returns counts: {"kept", "added", "deleted"}.
+    """
+    _check_index(index)
+
+    deleted = _get_deleted(index)
+    new_ids = {c.id for c in chunks}
+
+    store: ChunkStore = index["chunks"]
+    stale_rows = []
+    kept = 0
+    for row in _get_doc_rows(index).get(doc_id, []):
+        if deleted[row]:
+            continue
+        if store.get_id(row) in new_ids:
+            kept += 1
+        else:
+            stale_rows.append(int(row))
+
+    if stale_rows:
+        deleted[stale_rows] = True
+        _touch(index)
+
+    added = add_chunks_to_index(index, chunks)
+    if stale_rows and not added:
+        # add_chunks_to_index drops the stale postings itself when it changes anything
+        _update_lexical(index)
+    _maybe_compact(index)
+    return {"kept": kept, "added": added, "deleted": len(stale_rows)}
+
+
+def compact_index(index: Dict[str, Any]) -> int:
+    """
+    Physically drop tombstoned rows from the index.
+    IVF centroids are kept; only the list layout is rebuilt.
+    Returns the number of rows removed.
+    """
+    _check_index(index)
+
+    deleted = _get_deleted(index)
+    n_removed = int(deleted.sum())
+    if n_removed == 0:
+        return 0
+
+    keep = np.flatnonzero(~deleted)
+    index["embeddings"] = np.ascontiguousarray(index["embeddings"][keep])
+    index["chunks"] = index["chunks"].select(keep)
+    index["deleted"] = np.zeros(len(keep), dtype=bool)
+    index.pop("id_to_row", None)
+    if "quantized" in index:
+        index["quantized"]["codes"] = np.ascontiguousarray(index["quantized"]["codes"][keep])
+    if "lexical" in index:
+        index["lexical"] = select_lexical_rows(index["lexical"], keep)
+
+    if index.get("backend", "exact") == "ivf":
+        ivf = index["ivf"]
+        ivf["assignments"] = ivf["assignments"][keep]
+        ivf["list_ids"], ivf["list_offsets"] = build_list_layout(
+            ivf["assignments"], ivf["centroids"].shape[0]
+        )
+
+    _touch(index)
+    return n_removed
+
+
+def _maybe_compact(index: Dict[str, Any]) -> None:
+    deleted = _get_deleted(index)
+    if deleted.size and deleted.mean() > COMPACTION_THRESHOLD:
+        compact_index(index)
+
+
+def _current_version(root: Path) -> Optional[str]:
+    # Version folder named by CURRENT, None for the single-folder layout of older saves
+    try:
+        return (root / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+    except OSError:
+        return None
+
+
+def get_index_dir(name: str) -> Path:
+    """
+    Returns the folder where the current version of the index called `name` is stored.
+    """
+    root = Path(INDEXES_DIR) / name
+    version = _current_version(root)
+    return root / version if version else root
+
+
+def _remove_old_versions(root: Path, current: str, previous: Optional[str]) -> None:
+    # Only complete versions saved before `previous` are removed: a folder
+    # without a header (or with a newer one) may be a save still running in
+    # another thread or process (so one left by a crashed save stays until
+    # removed by hand). Best effort: a folder still memory-mapped
+    # by a reader can't be deleted on Windows (POSIX allows it), so failures
+    # are simply retried on the next save.
+    if previous is None:
+        return
+    try:
+        cutoff = (root / previous / HEADER_FILE).stat().st_mtime
+    except OSError:
+        return
+    for path in root.iterdir():
+        if path.name in (CURRENT_FILE, current, previous) or path.name.endswith(".tmp"):
+            continue
+        try:
+            if path.is_dir():
+                if (path / HEADER_FILE).stat().st_mtime < cutoff:
+                    shutil.rmtree(path)
+            else:
+                # Loose files are the pre-versioning layout
+                path.unlink()
+        except OSError:
+            pass
+
+
+def save_text_index(index: Dict[str, Any], name: str, with_lexical: bool = True) -> Path:
+    """
+    Save an index to a new version folder under data/indexes/<name>/
+    so it can be loaded later without re-reading the PDF or re-embedding
+    anything. Tombstoned rows are left out of the saved files.
+    `index` itself is not compacted and keeps its version: other threads
+    may be searching it, and caches keyed by the version stay valid.
+
+    The BM25 postings are saved too, and built here if no search has
+    needed them yet, so a loaded index never builds them inside a
+    request. with_lexical=False skips that for dense-only indexes
+    (postings that already exist are still saved).
+    Returns the folder the index was written to.
+    """
+    _check_index(index)
+    if with_lexical:
+        # Built on the caller's index, like any other lazily built structure
+        _get_lexical(index)
+
+    # Compact a copy; the saved index is the same content under the same version
+    version = index.get("version") or uuid.uuid4().hex
+    index = copy_index(index)
+    compact_index(index)
+
+    embeddings = np.ascontiguousarray(index["embeddings"], dtype="float32")
+    chunks = index["chunks"]
+
+    if embeddings.ndim != 2 or embeddings.shape[0] != len(chunks):
+        raise ValueError(
+            f"Embeddings shape {embeddings.shape} does not match {len(chunks)} chunks."
+        )
+
+    # Every save goes to a new folder, so an index loaded from the previous
+    # one keeps its memory-mapped files (replacing a mapped file fails on
+    # Windows); CURRENT is switched to it once it is complete
+    root = Path(INDEXES_DIR) / name
+    previous = _current_version(root)
+    index_dir = root / f"v-{uuid.uuid4().hex}"
+    index_dir.mkdir(parents=True)
+
+    # Raw row-major float32, no header, so np.memmap can open it directly
+    embeddings.tofile(index_dir / EMBEDDINGS_FILE)
+
+    chunks.save(index_dir)
+
+    backend = index.get("backend", "exact")
+    if backend == "ivf":
+        np.save(index_dir / IVF_CENTROIDS_FILE, index["ivf"]["centroids"])
+        np.save(index_dir / IVF_ASSIGNMENTS_FILE, index["ivf"]["assignments"])
+
+    quantized = index.get("quantized")
+    if quantized is not None:
+        np.save(index_dir / QUANTIZED_CODES_FILE, quantized["codes"])
+        if "scale" in quantized:
+            np.save(index_dir / QUANTIZED_SCALE_FILE, quantized["scale"])
+
+    if "lexical" in index:
+        save_lexical_index(index["lexical"], index_dir)
+
+    # Header is written last: a folder without a header is an unfinished save
+    header = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "model_name": index.get("model_name", get_text_embedding_model_name()),
+        "embedding_backend": index.get("embedding_backend", get_text_embedding_backend()),
+        "dim": int(embeddings.shape[1]),
+        "n_chunks": int(embeddings.shape[0]),
+        "dtype": "float32",
+        "normalized": True,
+        "backend": backend,
+        "storage": quantized["mode"] if quantized is not None else "float32",
+        "version": version,
+        "lexical": "lexical" in index,
+    }
+    if backend == "ivf":
+        header["nprobe"] = int(index["ivf"].get("nprobe", DEFAULT_NPROBE))
+    with open(index_dir / HEADER_FILE, "w", encoding="utf-8") as f:
+        json.dump(header, f, indent=2)
+
+    # Switch readers over (a tiny file, never memory-mapped); the temp
+    # name is unique so overlapping saves don't share it
+    tmp_path = root / f"{CURRENT_FILE}.{index_dir.name}.tmp"
+    tmp_path.write_text(index_dir.name, encoding="utf-8")
+    os.replace(tmp_path, root / CURRENT_FILE)
+
+    # Keep the previous version for readers that are still loading it
+    _remove_old_versions(root, index_dir.name, previous)
+
+    return index_dir
+
+
+def index_exists(name: str) -> bool:
+    """
+    True if a saved index called `name` exists on disk. A CURRENT file
+    pointing at a missing or broken folder counts: load_text_index then
+    raises instead of the index silently being treated as new.
+    """
+    root = Path(INDEXES_DIR) / name
+    return (root / CURRENT_FILE).exists() or (root / HEADER_FILE).exists()
+
+
+def load_text_index(
+    name: str,
+    expected_model_name: Optional[str] = TEXT_EMBEDDING_MODEL_NAME,
+) -> Dict[str, Any]:
+    """
+    Load an index saved with save_text_index.
+
+    The embedding matrix is memory-mapped (read-only), so loading is
+    just a file open; pages are read from disk as searches touch them.
+    A float16 / int8 copy (storage != "float32") is loaded into RAM.
+    Saved BM25 postings are memory-mapped as well.
+    Raises ValueError if the index was built with a different model,
+    a different embedding backend than the current one (checked along
+    with the model name) or an incompatible format version.
+    """
+    index_dir = get_index_dir(name)
+    header_path = index_dir / HEADER_FILE
+
+    if not header_path.exists():
+        raise FileNotFoundError(f"No saved index at: {index_dir}")
+
+    with open(header_path, "r", encoding="utf-8") as f:
+        header = json.load(f)
+
+    version = header.get("format_version")
+    if version != INDEX_FORMAT_VERSION:
+        raise ValueError(
+            f"Index '{name}' has format version {version}, "
+            f"expected {INDEX_FORMAT_VERSION}. Please rebuild it."
+        )
+
+    model_name = header["model_name"]
+    if expected_model_name is not None and model_name != expected_model_name:
+        raise ValueError(
+            f"Index '{name}' was built with model '{model_name}', "
+            f"but the current model is '{expected_model_name}'."
+        )
+
+    # Indexes saved before the backend was recorded were all built with torch
+    embedding_backend = header.get("embedding_backend", "torch")
+    if expected_model_name is not None and embedding_backend != get_text_embedding_backend():
+        raise ValueError(
+            f"Index '{name}' was built with the '{embedding_backend}' embedding backend, "
+            f"but the current one is '{get_text_embedding_backend()}'."
+        )
+
+    n_chunks = int(header["n_chunks"])
+    dim = int(header["dim"])
+
+    if n_chunks > 0:
+        embeddings = np.memmap(
+            index_dir / EMBEDDINGS_FILE,
+            dtype="float32",
+            mode="r",
+            shape=(n_chunks, dim),
+        )
+    else:
+        embeddings = np.zeros((0, dim), dtype="float32")
+
+    chunks = ChunkStore.load(index_dir, mmap=True)
+
+    if len(chunks) != n_chunks:
+        raise ValueError(
+            f"Index '{name}' is corrupted: header says {n_chunks} chunks, "
+            f"found {len(chunks)}."
+        )
+
+    index = {
+        "embeddings": embeddings,
+        "chunks": chunks,
+        "deleted": np.zeros(n_chunks, dtype=bool),
+        "model_name": model_name,
+        "embedding_backend": embedding_backend,
+        "version": header.get("version") or uuid.uuid4().hex,
+        "backend": header.get("backend", "exact"),
     }
+
+    if index["backend"] == "ivf":
+        centroids = np.load(index_dir / IVF_CENTROIDS_FILE)
+        assignments = np.load(index_dir / IVF_ASSIGNMENTS_FILE)
+        list_ids, list_offsets = build_list_layout(assignments, centroids.shape[0])
+        index["ivf"] = {
+            "centroids": centroids,
+            "assignments": assignments,
+            "list_ids": list_ids,
+            "list_offsets": list_offsets,
+            "nprobe": int(header.get("nprobe", DEFAULT_NPROBE)),
+        }
+
+    storage = header.get("storage", "float32")
+    if storage != "float32":
+        index["quantized"] = {"mode": storage, "codes": np.load(index_dir / QUANTIZED_CODES_FILE)}
+        if storage == "int8":
+            index["quantized"]["scale"] = np.load(index_dir / QUANTIZED_SCALE_FILE)
+
+    if header.get("lexical"):
+        index["lexical"] = load_lexical_index(index_dir, mmap=True)
+
     return index
 
 
+def get_index_version(index: Dict[str, Any]) -> str:
+    """
+    Id of the current contents of `index`, for keying caches; it changes
+    whenever the index does. Hand-built indexes get one on first use.
+    """
+    _check_index(index)
+    return index["version"]
+
+
+def _check_index(index: Dict[str, Any]) -> None:
+    if "embeddings" not in index or "chunks" not in index:
+        raise ValueError("Index is missing 'embeddings' or 'chunks' keys.")
+    if not isinstance(index["chunks"], ChunkStore):
+        # Hand-built index with a plain list of chunks
+        index["chunks"] = ChunkStore.from_chunks(list(index["chunks"]))
+    if not index.get("version"):
+        # Caches are keyed by version: hand-built indexes must not share one
+        index["version"] = uuid.uuid4().hex
+
+
+def _search_rows(
+    index: Dict[str, Any],
+    query_embeddings: np.ndarray,
+    top_k: int,
+    nprobe: Optional[int] = None,
+    exact: bool = False,
+    rows: Optional[np.ndarray] = None,
+    rescore: bool = True,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Core search over normalized query vectors of shape (Q, D).
+    Returns one (scores, row_ids) pair per query, best first.
+    exact=True ignores the ANN backend and the quantized copy
+    (used for recall checks).
+
+    `rows` restricts the search to those live row ids; the filter is applied
+    before scoring, so a narrow filter means a small matmul.
+
+    With a quantized copy, candidates are scored in compact form and the best
+    RESCORE_FACTOR * top_k are rescored in float32 (rescore=False skips that,
+    only used to measure what the rescoring buys).
+    """
+    embeddings = index["embeddings"]  # shape: (N, D)
+    quantized = None if exact else index.get("quantized")
+    deleted = _get_deleted(index)
+    results: List[Tuple[np.ndarray, np.ndarray]] = []
+
+    def score(block: np.ndarray, candidates: Optional[np.ndarray]) -> np.ndarray:
+        if quantized is not None:
+            return approximate_scores(quantized, block, candidates)
+        if candidates is None:
+            # cos_sim = A · B (both unit length)
+            return block @ embeddings.T  # shape: (q, N)
+        return block @ np.asarray(embeddings[candidates]).T  # shape: (q, len(candidates))
+
+    def pick(query_embedding: np.ndarray, row_scores: np.ndarray, candidates: Optional[np.ndarray]):
+        rescoring = quantized is not None and rescore
+        best = top_k_indices(row_scores, top_k * RESCORE_FACTOR if rescoring else top_k)
+        best = best[np.isfinite(row_scores[best])]
+        best_rows = best if candidates is None else candidates[best]
+        if not rescoring:
+            return row_scores[best], best_rows
+        # Full-precision scores for the over-fetched rows only
+        exact_scores = np.asarray(embeddings[best_rows], dtype="float32") @ query_embedding
+        best = top_k_indices(exact_scores, top_k)
+        return exact_scores[best], best_rows[best]
+
+    if rows is not None:
+        if rows.size <= FILTERED_EXACT_MAX_ROWS or index.get("backend", "exact") != "ivf" or exact:
+            # Exact search over just the selected rows
+            for start in range(0, query_embeddings.shape[0], QUERY_BLOCK_SIZE):
+                block = query_embeddings[start:start + QUERY_BLOCK_SIZE]
+                for query_embedding, row_scores in zip(block, score(block, rows)):
+                    results.append(pick(query_embedding, row_scores, rows))
+            return results
+
+        # Large filter on an IVF index: probe lists as usual, keep allowed rows only
+        allowed = np.zeros(embeddings.shape[0], dtype=bool)
+        allowed[rows] = True
+    else:
+        allowed = ~deleted if deleted.any() else None
+
+    if index.get("backend", "exact") == "ivf" and not exact:
+        for query_embedding in query_embeddings:
+            candidates = ivf_candidates(index["ivf"], query_embedding, nprobe=nprobe)
+            if allowed is not None:
+                candidates = candidates[allowed[candidates]]
+            row_scores = score(query_embedding[None, :], candidates)[0]
+            results.append(pick(query_embedding, row_scores, candidates))
+        return results
+
+    for start in range(0, query_embeddings.shape[0], QUERY_BLOCK_SIZE):
+        block = query_embeddings[start:start + QUERY_BLOCK_SIZE]
+        scores = score(block, None)
+        if allowed is not None:
+            scores[:, ~allowed] = -np.inf
+        for query_embedding, row_scores in zip(block, scores):
+            results.append(pick(query_embedding, row_scores, None))
+    return results
+
+
+def _to_results(
+    index: Dict[str, Any],
+    scores: np.ndarray,
+    rows: np.ndarray,
+) -> List[Tuple[float, DocumentChunk]]:
+    chunks = index["chunks"]
+    return [(float(score), chunks[int(row)]) for score, row in zip(scores, rows)]
+
+
+def resolve_search_mode(mode: str) -> str:
+    """
+    Map "auto" to "hybrid" or "lexical" depending on whether the embedding
+    model is loaded yet; other modes are returned as is.
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}.")
+    if mode == "auto":
+        return "hybrid" if is_text_embedding_model_loaded() else "lexical"
+    return mode
+
+
+def _lexical_rows(
+    index: Dict[str, Any],
+    query: str,
+    top_k: int,
+    rows: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # BM25 top_k over the live rows (or only `rows`); rows without a matching term are dropped
+    scores = bm25_scores(_get_lexical(index), query)
+    candidates = rows if rows is not None else np.flatnonzero(scores)
+    candidate_scores = scores[candidates]
+    best = top_k_indices(candidate_scores, top_k)
+    best = best[candidate_scores[best] > 0]
+    return candidate_scores[best], candidates[best]
+
+
+def _fuse_rankings(rankings: List[np.ndarray], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Reciprocal rank fusion of several best-first row rankings
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking.tolist()):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+    best = sorted(fused.items(), key=lambda item: -item[1])[:top_k]
+    return (
+        np.array([score for _, score in best], dtype="float32"),
+        np.array([row for row, _ in best], dtype=np.int64),
+    )
+
+
+def _search_queries(
+    index: Dict[str, Any],
+    queries: List[str],
+    top_k: int,
+    nprobe: Optional[int],
+    rows: Optional[np.ndarray],
+    mode: str,
+) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    (scores, row_ids) per query for any search mode.
+    Dense scores are cosine similarities, lexical ones BM25 scores,
+    hybrid ones RRF scores (only the order is meaningful).
+    """
+    mode = resolve_search_mode(mode)
+
+    if mode == "lexical":
+        return [_lexical_rows(index, query, top_k, rows) for query in queries]
+
+    query_embeddings = embed_queries(queries)  # shape: (Q, D)
+    if mode == "dense":
+        return _search_rows(index, query_embeddings, top_k, nprobe=nprobe, rows=rows)
+
+    n_candidates = max(top_k, HYBRID_CANDIDATES)
+    dense = _search_rows(index, query_embeddings, n_candidates, nprobe=nprobe, rows=rows)
+    return [
+        _fuse_rankings([dense_rows, _lexical_rows(index, query, n_candidates, rows)[1]], top_k)
+        for query, (_, dense_rows) in zip(queries, dense)
+    ]
+
+
 def search_text_index(
     index: Dict[str, Any],
     query: str,
     top_k: int = 5,
+    nprobe: Optional[int] = None,
+    doc_ids: Optional[List[str]] = None,
+    mode: str = "dense",
+    modalities: Optional[List[str]] = None,
+    page_range: Optional[Tuple[int, int]] = None,
 ) -> List[Tuple[float, DocumentChunk]]:
     """
     Search the index with a query string.
     Returns a list of (similarity_score, DocumentChunk) sorted by score (desc).
 
     Uses cosine similarity between query embedding and chunk embeddings.
+    Since both sides are normalized, this is a single matrix-vector product.
+    For IVF indexes, `nprobe` overrides how many lists are scanned.
+    `doc_ids` restricts the search to chunks of those documents,
+    `modalities` to those modalities (e.g. ["table"]) and `page_range`
+    to pages first..last (inclusive). Filters are applied before scoring,
+    so narrower filters make the search cheaper.
+    `mode` picks dense, lexical (BM25), hybrid or auto retrieval (see module docstring).
     """
-    if "embeddings" not in index or "chunks" not in index:
-        raise ValueError("Index is missing 'embeddings' or 'chunks' keys.")
+    _check_index(index)
 
-    embeddings = index["embeddings"]  # shape: (N, D)
-    chunks = index["chunks"]
+    if index["embeddings"].shape[0] == 0:
+        return []
 
-    if embeddings.shape[0] == 0:
+    rows = _allowed_rows(index, doc_ids, modalities, page_range)
+    if rows is not None and rows.size == 0:
         return []
 
-    # Embed the query
-    query_embedding = np.array(embed_texts([query])[0], dtype="float32")  # shape: (D,)
+    with span("search", items=1, mode=mode):
+        scores, result_rows = _search_queries(index, [query], top_k, nprobe, rows, mode)[0]
+        return _to_results(index, scores, result_rows)
 
-    # Compute cosine similarity
-    # cos_sim = (A · B) / (||A|| * ||B||)
-    dot_products = embeddings @ query_embedding  # shape: (N,)
-    norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query_embedding)
-    # Avoid division by zero
-    norms = np.where(norms == 0, 1e-10, norms)
-    cosine_similarities = dot_products / norms  # shape: (N,)
 
-    # Get indices of top_k highest similarities
-    top_k = min(top_k, len(chunks))
-    top_indices = np.argsort(-cosine_similarities)[:top_k]
+def search_text_index_batch(
+    index: Dict[str, Any],
+    queries: List[str],
+    top_k: int = 5,
+    nprobe: Optional[int] = None,
+    doc_ids: Optional[List[str]] = None,
+    mode: str = "dense",
+    modalities: Optional[List[str]] = None,
+    page_range: Optional[Tuple[int, int]] = None,
+) -> List[List[Tuple[float, DocumentChunk]]]:
+    """
+    Search the index with many queries at once.
+    Returns one result list per query, in the same order as `queries`.
+    `doc_ids`, `modalities` and `page_range` filter every query,
+    as in search_text_index.
 
-    results: List[Tuple[float, DocumentChunk]] = []
-    for idx in top_indices:
-        score = float(cosine_similarities[idx])
-        chunk = chunks[int(idx)]
-        results.append((score, chunk))
+    All queries are embedded in one model call and scored with one
+    (Q, D) x (D, N) product per block of QUERY_BLOCK_SIZE queries.
+    """
+    _check_index(index)
 
-    return results
+    if not queries:
+        return []
+
+    if index["embeddings"].shape[0] == 0:
+        return [[] for _ in queries]
+
+    rows = _allowed_rows(index, doc_ids, modalities, page_range)
+    if rows is not None and rows.size == 0:
+        return [[] for _ in queries]
+
+    with span("search", items=len(queries), mode=mode):
+        return [
+            _to_results(index, scores, result_rows)
+            for scores, result_rows in _search_queries(index, queries, top_k, nprobe, rows, mode)
+        ]
+
+
+def _sample_query_embeddings(
+    index: Dict[str, Any],
+    queries: Optional[List[str]],
+    n_samples: int,
+    seed: int,
+) -> np.ndarray:
+    # Real queries if given, otherwise a random sample of stored chunk embeddings
+    if queries:
+        return embed_queries(queries)
+    embeddings = index["embeddings"]
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(embeddings.shape[0], size=min(n_samples, embeddings.shape[0]), replace=False)
+    return np.asarray(embeddings[np.sort(sample)], dtype="float32")
+
+
+def _mean_recall(
+    approx: List[Tuple[np.ndarray, np.ndarray]],
+    exact: List[Tuple[np.ndarray, np.ndarray]],
+) -> float:
+    recalls = []
+    for (_, approx_rows), (_, exact_rows) in zip(approx, exact):
+        if len(exact_rows) == 0:
+            continue
+        recalls.append(len(np.intersect1d(approx_rows, exact_rows)) / len(exact_rows))
+    return float(np.mean(recalls)) if recalls else 1.0
+
+
+def evaluate_ann_recall(
+    index: Dict[str, Any],
+    queries: Optional[List[str]] = None,
+    top_k: int = 10,
+    nprobe: Optional[int] = None,
+    n_samples: int = 100,
+    seed: int = 0,
+) -> float:
+    """
+    recall@k of the ANN backend against exact search:
+    the average fraction of the exact top_k rows that the ANN search also returns.
+
+    If no queries are given, `n_samples` stored chunk embeddings are used
+    as queries, so this works without loading the embedding model.
+    """
+    _check_index(index)
+
+    if index["embeddings"].shape[0] == 0:
+        return 1.0
+
+    query_embeddings = _sample_query_embeddings(index, queries, n_samples, seed)
+    approx = _search_rows(index, query_embeddings, top_k, nprobe=nprobe)
+    exact = _search_rows(index, query_embeddings, top_k, exact=True)
+    return _mean_recall(approx, exact)
+
+
+def quantization_report(
+    index: Dict[str, Any],
+    storage: Optional[str] = None,
+    queries: Optional[List[str]] = None,
+    top_k: int = 10,
+    n_samples: int = 100,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Memory saved and recall@k lost by quantized storage, versus float32.
+
+    Uses the index's own quantized copy, or a temporary one built with
+    `storage` ("float16" / "int8") so modes can be compared on the same
+    corpus without changing the index. Recall is measured with a full scan
+    (IVF is left out), so it only reflects the quantization:
+    - recall_at_k:            with float32 rescoring (what search returns)
+    - recall_at_k_no_rescore: compact scores only
+
+    Queries are sampled like in evaluate_ann_recall.
+    """
+    _check_index(index)
+
+    quantized = quantize(index["embeddings"], storage) if storage else index.get("quantized")
+    if quantized is None:
+        raise ValueError("Index has no quantized storage; pass storage='float16' or 'int8'.")
+
+    embeddings = index["embeddings"]
+    float32_bytes = int(embeddings.shape[0] * embeddings.shape[1] * 4)
+    compact_bytes = quantized_nbytes(quantized)
+    report = {
+        "storage": quantized["mode"],
+        "n_chunks": int(embeddings.shape[0]),
+        "float32_bytes": float32_bytes,
+        "quantized_bytes": compact_bytes,
+        "saved_bytes": float32_bytes - compact_bytes,
+        "saved_fraction": 1.0 - compact_bytes / float32_bytes if float32_bytes else 0.0,
+        "recall_at_k": 1.0,
+        "recall_at_k_no_rescore": 1.0,
+        "top_k": top_k,
+    }
+    if embeddings.shape[0] == 0:
+        return report
+
+    # Same rows and tombstones, full scan, only the scoring precision differs
+    probe = {**index, "backend": "exact", "quantized": quantized}
+    query_embeddings = _sample_query_embeddings(index, queries, n_samples, seed)
+    exact = _search_rows(probe, query_embeddings, top_k, exact=True)
+    report["recall_at_k"] = _mean_recall(_search_rows(probe, query_embeddings, top_k), exact)
+    report["recall_at_k_no_rescore"] = _mean_recall(
+        _search_rows(probe, query_embeddings, top_k, rescore=False), exact
+    )
+    return report
@@ -0,0 +1,166 @@
+"""
+Background indexing for the UI: add PDFs to the served index without
+blocking queries.
+
+- save_uploaded_pdf(file_name, data): write an uploaded PDF to data/raw_docs
+- BackgroundIndexer(index_name): serves one index and updates it on a
+  background thread, one PDF at a time
+
+If the saved index exists but can't be loaded, jobs fail instead of
+replacing it with a new index of the uploaded document alone.
+
+Each job works on a copy of the current index (app.index.copy_index):
+the PDF is ingested into the copy, the copy is saved to a new version
+folder under data/indexes/ (the served index keeps its memory-mapped
+files), then swapped in under a lock. Queries keep running on the
+previous index until the swap and never see a half-updated one.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import os
+import queue
+import threading
+import time
+
+from app.config import RAW_DOCS_DIR
+from app.index import copy_index, index_exists, load_text_index, save_text_index
+from app.qa_pipeline import build_qa_index_from_pdf, doc_id_for_pdf, update_qa_index_with_pdf
+
+# Finished / failed jobs kept for the status display
+MAX_JOB_HISTORY = 20
+
+
+def save_uploaded_pdf(file_name: str, data: bytes) -> str:
+    """
+    Write an uploaded PDF to data/raw_docs and return its file name.
+    The file is written under a temp name and renamed, so a job reading
+    an older version of the same file never sees a half-written one.
+    Raises ValueError if it doesn't look like a PDF.
+    """
+    # Drop any directory part sent by the client
+    pdf_name = Path(file_name).name
+    if not pdf_name.lower().endswith(".pdf") or not data.startswith(b"%PDF"):
+        raise ValueError(f"'{file_name}' is not a PDF file.")
+
+    raw_dir = Path(RAW_DOCS_DIR)
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = raw_dir / (pdf_name + ".upload")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, raw_dir / pdf_name)
+    return pdf_name
+
+
+class BackgroundIndexer:
+    """
+    Owns the served index (get_index) and a queue of PDFs to ingest (submit).
+    Safe to use from several threads (e.g. Streamlit sessions).
+    """
+
+    def __init__(self, index_name: str):
+        self.index_name = index_name
+        self._index: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._jobs: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._queued: List[str] = []
+        self._current: Optional[Dict[str, Any]] = None
+        self._history: List[Dict[str, Any]] = []
+        # Why the saved index could not be loaded (None if it loaded or doesn't exist)
+        self.load_error: Optional[str] = None
+
+        if index_exists(index_name):
+            try:
+                self._index = load_text_index(index_name)
+            except (ValueError, OSError) as e:
+                self.load_error = f"Saved index '{index_name}' could not be loaded: {str(e).rstrip('.')}."
+                print(f"[WARN] {self.load_error}")
+
+        self._thread = threading.Thread(target=self._run, name="background-indexer", daemon=True)
+        self._thread.start()
+
+    def get_index(self) -> Optional[Dict[str, Any]]:
+        """
+        The index to query, or None until the first document is indexed.
+        Never modified after it is returned; updates swap in a new one.
+        """
+        with self._lock:
+            return self._index
+
+    def submit(self, pdf_name: str, doc_id: Optional[str] = None) -> None:
+        """
+        Queue a PDF from data/raw_docs. Its chunks replace those of an
+        earlier version of the same doc_id (default: the file name stem).
+        """
+        job = {"pdf_name": pdf_name, "doc_id": doc_id or doc_id_for_pdf(pdf_name)}
+        with self._lock:
+            self._queued.append(pdf_name)
+        self._jobs.put(job)
+
+    def status(self) -> Dict[str, Any]:
+        """
+        {"current": running job or None, with pages_done / n_pages /
+        ocr_queue, "queued": [pdf names], "history": [finished jobs,
+        newest first], "n_chunks": size of the served index,
+        "load_error": see __init__}
+        """
+        with self._lock:
+            return {
+                "load_error": self.load_error,
+                "current": dict(self._current) if self._current else None,
+                "queued": list(self._queued),
+                "history": [dict(job) for job in reversed(self._history)],
+                "n_chunks": len(self._index["chunks"]) if self._index is not None else 0,
+            }
+
+    def _progress(self, update: Dict[str, int]) -> None:
+        with self._lock:
+            if self._current is not None:
+                self._current.update(update)
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            with self._lock:
+                self._queued.remove(job["pdf_name"])
+                self._current = {**job, "started": time.time(), "pages_done": 0, "n_pages": 0, "ocr_queue": 0}
+
+            try:
+                self._index_pdf(job["pdf_name"], job["doc_id"])
+                outcome = {"state": "done"}
+            except Exception as e:
+                print(f"[WARN] Indexing {job['pdf_name']} failed: {e}")
+                outcome = {"state": "failed", "error": str(e)}
+
+            with self._lock:
+                finished = {**self._current, **outcome, "seconds": time.time() - self._current["started"]}
+                self._history = (self._history + [finished])[-MAX_JOB_HISTORY:]
+                self._current = None
+            self._jobs.task_done()
+
+    def _index_pdf(self, pdf_name: str, doc_id: str) -> None:
+        current = self.get_index()
+        if current is None and self.load_error is not None:
+            # Building from this one PDF would overwrite the user's whole corpus
+            raise RuntimeError(
+                f"{self.load_error} Not overwriting it: rebuild it "
+                f"(app.qa_pipeline.build_corpus_index) or move it out of data/indexes/."
+            )
+        if current is None:
+            new_index = build_qa_index_from_pdf(pdf_name=pdf_name, doc_id=doc_id, progress=self._progress)
+        else:
+            # Work on a copy: the current index keeps serving queries meanwhile
+            new_index = copy_index(current)
+            counts = update_qa_index_with_pdf(new_index, pdf_name, doc_id, progress=self._progress)
+            self._progress(counts)
+
+        save_text_index(new_index, self.index_name)
+        # Atomic swap: readers get either the old or the new index
+        with self._lock:
+            self._index = new_index
+        print(f"Index '{self.index_name}' updated with {pdf_name} ({len(new_index['chunks'])} chunks).")
+
+    def wait(self) -> None:
+        """
+        Block until every queued job has finished (for scripts and tests).
+        """
+        self._jobs.join()
@@ -4,23 +4,104 @@ Functions to read PDFs and convert them into DocumentChunk objects.
 - STEP 3: extract_text_from_pdf (for debugging)
 - STEP 3: get_pdf_page_texts (for chunking)
 - STEP 8: extract_image_ocr_chunks (for images + OCR)
+- extract_table_chunks (tables, per page, with page number and bbox)
+- iter_pdf_chunks: single pass over the PDF, yielding text/OCR/table chunks
+  as they are produced (used to build the index in batches)
+
+OCR is the slowest part of ingestion, so extract_image_ocr_chunks:
+- triages every page first (triage_page): text-native pages are not OCR'd,
+  on mixed pages only images without a text layer on top are OCR'd, and
+  scanned pages are OCR'd once from a render at <= OCR_MAX_RENDER_DPI,
+- skips tiny / flat (low-entropy) decorative images,
+- OCRs each unique image once (logos repeated on every page are shared),
+- spreads the OCR calls over a pool of worker processes.
+
+Tables are found in-process by PyMuPDF's table finder (page.find_tables),
+page by page, so every table keeps its page number and bounding box.
+Batches of pages go to worker processes, each opening the PDF itself
+(PyMuPDF documents can't be shared between processes or threads).
+tabula (Java) is only used as a fallback when the PyMuPDF table finder
+is not available (PyMuPDF < 1.23).
+
+PyMuPDF, PIL, pytesseract and tabula are imported on first use,
+so importing this module (or anything that imports it) stays cheap.
 """
 
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Any, Callable, List, Dict, Optional, Set, Tuple, Iterator
+import csv
+import hashlib
 import io
+import os
+import time
 
-import fitz  # PyMuPDF
-from PIL import Image
-import pytesseract
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+from app.config import RAW_DOCS_DIR
+from app.models import DocumentChunk
+from app.utils import ChunkIdAllocator, iter_batches
+from app.chunk_store import ChunkStore
+from app.tracing import span, tracer
+from app.chunking import chunk_pages, DEFAULT_CHUNK_TOKENS, DEFAULT_OVERLAP_TOKENS
 
+# Images smaller than this (in pixels) are treated as decorative and not OCR'd
+OCR_MIN_IMAGE_SIDE = 32
+OCR_MIN_IMAGE_AREA = 64 * 64
 
-import tabula
+# Grayscale entropy (bits) below which an image is considered flat (no text)
+OCR_MIN_ENTROPY = 1.0
 
+# Page triage: a page with fewer characters of text layer than this, whose
+# images cover at least this share of its area, is a scanned page
+SCANNED_MAX_TEXT_CHARS = 50
+SCANNED_MIN_IMAGE_COVERAGE = 0.6
 
-from app.config import RAW_DOCS_DIR
-from app.models import DocumentChunk
+# An image with at least this many characters of text layer on top of it
+# (e.g. a figure with real text labels) is not OCR'd
+REGION_MIN_TEXT_CHARS = 20
+
+# Scanned pages are rendered for OCR at their native resolution, capped here
+OCR_MAX_RENDER_DPI = 200
+OCR_MIN_RENDER_DPI = 72
+
+# Default size of the OCR process pool
+DEFAULT_OCR_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+# Pages whose text is chunked together (one tokenizer call) in iter_pdf_chunks
+TEXT_PAGE_BATCH = 8
+
+# Pages per table-finding job sent to a worker process
+TABLE_PAGE_BATCH = 16
+
+NO_TEXT_PLACEHOLDER = "[NO TEXT DETECTED IN IMAGE]"
+
+TESSERACT_CMD = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+
+_pytesseract = None
+
+
+def open_pdf(pdf_path: Path):
+    """
+    Open a PDF with PyMuPDF (imported on first use).
+    """
+    import fitz  # PyMuPDF
+
+    with span("pdf_open"):
+        return fitz.open(pdf_path)
+
+
+def get_pytesseract():
+    """
+    Returns the pytesseract module, configured on first use.
+    Also called inside OCR worker processes.
+    """
+    global _pytesseract
+    if _pytesseract is None:
+        import pytesseract
+
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+        _pytesseract = pytesseract
+    return _pytesseract
 
 
 def extract_text_from_pdf(pdf_name: str = "sample.pdf", max_pages: int = 3):
@@ -35,7 +116,7 @@ def extract_text_from_pdf(pdf_name: str = "sample.pdf", max_pages: int = 3):
 
     print(f"\n✅ Opening PDF: {pdf_path}\n")
 
-    document = fitz.open(pdf_path)
+    document = open_pdf(pdf_path)
 
     total_pages = len(document)
     print(f"Total Pages in PDF: {total_pages}\n")
@@ -61,73 +142,468 @@ def get_pdf_page_texts(pdf_name: str = "sample.pdf") -> List[str]:
     if not pdf_path.exists():
         raise FileNotFoundError(f"PDF not found at: {pdf_path}")
 
-    document = fitz.open(pdf_path)
+    document = open_pdf(pdf_path)
     page_texts: List[str] = []
 
     for page_number in range(len(document)):
         page = document[page_number]
-        text = page.get_text()
+        with span("text_extract", items=1):
+            text = page.get_text()
         page_texts.append(text)
 
     return page_texts
 
 
+def is_decorative_image(
+    width: int,
+    height: int,
+    min_side: int = OCR_MIN_IMAGE_SIDE,
+    min_area: int = OCR_MIN_IMAGE_AREA,
+) -> bool:
+    """
+    True for images too small to contain readable text (icons, rules, bullets).
+    """
+    return min(width, height) < min_side or width * height < min_area
+
+
+def ocr_image_bytes(image_bytes: bytes, min_entropy: float = OCR_MIN_ENTROPY) -> Optional[str]:
+    """
+    Decode an image and run Tesseract on it.
+    Returns None if the image is too flat to contain text (skipped).
+    Top-level function so it can run in a worker process.
+    """
+    from PIL import Image
+
+    # Load image with PIL
+    img_pil = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+
+    if min_entropy and img_pil.convert("L").entropy() < min_entropy:
+        return None
+
+    # Run OCR
+    return get_pytesseract().image_to_string(img_pil)
+
+
+def _ocr_image_bytes_timed(image_bytes: bytes, min_entropy: float = OCR_MIN_ENTROPY) -> Tuple[Optional[str], float]:
+    # ocr_image_bytes + its wall time, so worker-side OCR time can be traced in the parent
+    started = time.perf_counter()
+    text = ocr_image_bytes(image_bytes, min_entropy)
+    return text, time.perf_counter() - started
+
+
+def _traced_ocr_result(result: Tuple[Optional[str], float]) -> Optional[str]:
+    text, seconds = result
+    tracer.record("ocr_image", seconds, items=1)
+    return text
+
+
+def ocr_many_images(
+    images: List[bytes],
+    max_workers: Optional[int] = None,
+    min_entropy: float = OCR_MIN_ENTROPY,
+) -> List[Optional[str]]:
+    """
+    OCR a list of images, in a process pool when there is more than one
+    worker and more than one image. Results are in input order.
+    """
+    max_workers = max_workers or DEFAULT_OCR_WORKERS
+
+    if max_workers <= 1 or len(images) <= 1:
+        return [_traced_ocr_result(_ocr_image_bytes_timed(image, min_entropy)) for image in images]
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(images))) as pool:
+        results = pool.map(_ocr_image_bytes_timed, images, [min_entropy] * len(images))
+        return [_traced_ocr_result(result) for result in results]
+
+
+def collect_page_images(
+    document,
+    page,
+    known_xrefs: Dict[int, Optional[str]],
+    min_side: int = OCR_MIN_IMAGE_SIDE,
+    min_area: int = OCR_MIN_IMAGE_AREA,
+    only_xrefs: Optional[Set[int]] = None,
+) -> Tuple[List[Tuple[int, str]], Dict[str, bytes]]:
+    """
+    Find the images on one page worth OCR-ing (only those in `only_xrefs`
+    if given).
+
+    Returns:
+      - [(image_index, digest)] for every non-decorative image on the page
+      - {digest: image_bytes} for images not seen on any earlier page
+
+    known_xrefs (xref -> digest, or None if decorative) is updated in place
+    and shared across pages, so repeated images are only extracted once.
+    Images with different xrefs but identical bytes share one digest.
+    """
+    page_images: List[Tuple[int, str]] = []
+    new_images: Dict[str, bytes] = {}
+    seen_on_page = set()
+
+    for img_index, img in enumerate(page.get_images(full=True)):
+        xref = img[0]
+        if only_xrefs is not None and xref not in only_xrefs:
+            continue
+
+        if xref not in known_xrefs:
+            base_image = document.extract_image(xref)
+            if not base_image or is_decorative_image(
+                base_image.get("width", 0), base_image.get("height", 0), min_side, min_area
+            ):
+                known_xrefs[xref] = None
+            else:
+                image_bytes = base_image["image"]
+                digest = hashlib.sha1(image_bytes).hexdigest()
+                known_xrefs[xref] = digest
+                new_images.setdefault(digest, image_bytes)
+
+        digest = known_xrefs[xref]
+        if digest is None or digest in seen_on_page:
+            continue
+        seen_on_page.add(digest)
+        page_images.append((img_index, digest))
+
+    return page_images, new_images
+
+
+def _rect_area(x0: float, y0: float, x1: float, y1: float) -> float:
+    return max(0.0, x1 - x0) * max(0.0, y1 - y0)
+
+
+def triage_page(
+    page,
+    page_text: Optional[str] = None,
+    min_side: int = OCR_MIN_IMAGE_SIDE,
+    min_area: int = OCR_MIN_IMAGE_AREA,
+) -> Dict[str, Any]:
+    """
+    Decide what a page needs from OCR, from its text layer and image area:
+    - "text-native": the text layer has everything, nothing to OCR
+    - "mixed": some images have no text layer on top of them, OCR only those
+    - "scanned": (almost) no text layer and images cover most of the page,
+      OCR one render of the whole page instead of the embedded images
+
+    Returns {"kind", "text_chars", "image_coverage", "ocr_xrefs" (mixed),
+    "render_dpi" (scanned)}. Only image placements are read, no image
+    is decoded.
+    """
+    if page_text is None:
+        page_text = page.get_text()
+    text_chars = len("".join(page_text.split()))
+    page_rect = page.rect
+    page_area = max(page_rect.width * page_rect.height, 1.0)
+
+    images = [
+        info for info in page.get_image_info(xrefs=True)
+        if info.get("xref") and not is_decorative_image(info["width"], info["height"], min_side, min_area)
+    ]
+    # Image area clipped to the page (overlaps counted twice, hence the cap)
+    covered = sum(
+        _rect_area(max(x0, page_rect.x0), max(y0, page_rect.y0), min(x1, page_rect.x1), min(y1, page_rect.y1))
+        for x0, y0, x1, y1 in (info["bbox"] for info in images)
+    )
+    triage: Dict[str, Any] = {
+        "kind": "text-native",
+        "text_chars": text_chars,
+        "image_coverage": min(1.0, covered / page_area),
+        "ocr_xrefs": set(),
+        "render_dpi": None,
+    }
+    if not images:
+        return triage
+
+    if text_chars < SCANNED_MAX_TEXT_CHARS and triage["image_coverage"] >= SCANNED_MIN_IMAGE_COVERAGE:
+        # Native resolution of the largest image (pixels per inch of page), capped
+        largest = max(images, key=lambda info: _rect_area(*info["bbox"]))
+        width_inches = max(largest["bbox"][2] - largest["bbox"][0], 1.0) / 72.0
+        native_dpi = largest["width"] / width_inches
+        triage["kind"] = "scanned"
+        triage["render_dpi"] = int(min(OCR_MAX_RENDER_DPI, max(OCR_MIN_RENDER_DPI, native_dpi)))
+        return triage
+
+    # Characters of text layer whose word centre falls inside each image
+    words = page.get_text("words")
+    for info in images:
+        x0, y0, x1, y1 = info["bbox"]
+        covered_chars = sum(
+            len(w[4]) for w in words if x0 <= (w[0] + w[2]) / 2 <= x1 and y0 <= (w[1] + w[3]) / 2 <= y1
+        )
+        if covered_chars < REGION_MIN_TEXT_CHARS:
+            triage["ocr_xrefs"].add(info["xref"])
+    if triage["ocr_xrefs"]:
+        triage["kind"] = "mixed"
+    return triage
+
+
+def render_page_for_ocr(page, dpi: int) -> bytes:
+    """
+    Grayscale PNG of a whole page at `dpi`, for OCR of scanned pages.
+    """
+    import fitz  # PyMuPDF
+
+    return page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY).tobytes("png")
+
+
+def collect_page_ocr_inputs(
+    document,
+    page,
+    known_xrefs: Dict[int, Optional[str]],
+    page_text: Optional[str] = None,
+    min_side: int = OCR_MIN_IMAGE_SIDE,
+    min_area: int = OCR_MIN_IMAGE_AREA,
+) -> Tuple[List[Tuple[int, str]], Dict[str, bytes]]:
+    """
+    Same result as collect_page_images, after triage_page:
+    nothing for text-native pages, the images without text layer for mixed
+    pages, and one page render (image_index -1) for scanned pages.
+    """
+    with span("page_triage", items=1) as triage_span:
+        triage = triage_page(page, page_text, min_side, min_area)
+        triage_span.attrs["kind"] = triage["kind"]
+
+    if triage["kind"] == "scanned":
+        image_bytes = render_page_for_ocr(page, triage["render_dpi"])
+        digest = hashlib.sha1(image_bytes).hexdigest()
+        return [(-1, digest)], {digest: image_bytes}
+    if not triage["ocr_xrefs"]:
+        return [], {}
+    return collect_page_images(document, page, known_xrefs, min_side, min_area, only_xrefs=triage["ocr_xrefs"])
+
+
+def make_ocr_chunk(
+    doc_id: str,
+    page_number: int,
+    img_index: int,
+    digest: str,
+    ocr_text: Optional[str],
+    make_id: ChunkIdAllocator,
+) -> Optional[DocumentChunk]:
+    """
+    Wrap the OCR result of one image on one page as a DocumentChunk
+    (img_index -1: render of a whole scanned page).
+    Returns None for images that were skipped as too flat.
+    """
+    if ocr_text is None:
+        return None  # too flat to contain text
+
+    if not ocr_text.strip():
+        ocr_text = NO_TEXT_PLACEHOLDER
+
+    return DocumentChunk(
+        id=make_id(doc_id, "image_ocr", page_number, ocr_text),
+        doc_id=doc_id,
+        modality="image_ocr",
+        page=page_number,
+        content=ocr_text,
+        extra={"image_index": img_index, "image_digest": digest},
+    )
+
+
 def extract_image_ocr_chunks(
     pdf_name: str = "sample.pdf",
     doc_id: str = "sample_doc",
+    max_workers: Optional[int] = None,
+    min_image_side: int = OCR_MIN_IMAGE_SIDE,
+    min_image_area: int = OCR_MIN_IMAGE_AREA,
+    min_entropy: float = OCR_MIN_ENTROPY,
 ) -> List[DocumentChunk]:
     """
     Extracts images from the PDF and runs OCR on them.
     Returns a list of DocumentChunk objects with modality='image_ocr'.
+
+    Each unique image is OCR'd once and its text is attached to every
+    page it appears on. Decorative images (too small or too flat) and
+    images whose text is already in the text layer are skipped; scanned
+    pages are OCR'd from a capped-DPI render (see triage_page).
     """
     pdf_path = Path(RAW_DOCS_DIR) / pdf_name
 
     if not pdf_path.exists():
         raise FileNotFoundError(f"PDF not found at: {pdf_path}")
 
-    document = fitz.open(pdf_path)
-    chunks: List[DocumentChunk] = []
+    document = open_pdf(pdf_path)
+
+    # 1) Find all images (by digest) and the pages they appear on
+    known_xrefs: Dict[int, Optional[str]] = {}
+    unique_images: Dict[str, bytes] = {}
+    occurrences: List[Tuple[int, int, str]] = []  # (page_number, image_index, digest)
 
     for page_index in range(len(document)):
         page = document[page_index]
-        image_list = page.get_images(full=True)
+        page_images, new_images = collect_page_ocr_inputs(
+            document, page, known_xrefs, min_side=min_image_side, min_area=min_image_area
+        )
+        unique_images.update(new_images)
+        for img_index, digest in page_images:
+            occurrences.append((page_index + 1, img_index, digest))
 
-        if not image_list:
-            continue  # no images on this page
+    document.close()
 
-        for img_index, img in enumerate(image_list):
-            xref = img[0]
-            base_image = document.extract_image(xref)
-            image_bytes = base_image["image"]
+    # 2) OCR every unique image once, in parallel
+    digests = list(unique_images.keys())
+    texts = ocr_many_images(
+        [unique_images[d] for d in digests], max_workers=max_workers, min_entropy=min_entropy
+    )
+    ocr_by_digest = dict(zip(digests, texts))
+
+    # 3) One chunk per (page, image)
+    chunks: List[DocumentChunk] = []
+    make_id = ChunkIdAllocator()
+
+    for page_number, img_index, digest in occurrences:
+        chunk = make_ocr_chunk(
+            doc_id, page_number, img_index, digest, ocr_by_digest[digest], make_id
+        )
+        if chunk is not None:
+            chunks.append(chunk)
 
-            # Load image with PIL
-            img_pil = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    return chunks
 
-            # Run OCR
-            ocr_text = pytesseract.image_to_string(img_pil)
 
-            if not ocr_text.strip():
-                ocr_text = "[NO TEXT DETECTED IN IMAGE]"
+def table_rows_to_text(rows: List[List[Optional[str]]]) -> str:
+    """
+    CSV text of a table (one line per row), the format table chunks are indexed in.
+    Empty cells become "", line breaks inside cells become spaces.
+    """
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    for row in rows:
+        writer.writerow(["" if cell is None else " ".join(str(cell).split()) for cell in row])
+    return out.getvalue()
 
-            chunk = DocumentChunk(
-                id=f"img_ocr_{page_index+1}_{img_index}",
+
+def find_page_tables(page) -> List[Dict[str, Any]]:
+    """
+    Tables on one PyMuPDF page: [{"rows": [[cell, ...], ...], "bbox": [x0, y0, x1, y1]}].
+    Tables without any non-empty cell are dropped.
+    """
+    tables: List[Dict[str, Any]] = []
+    for table in page.find_tables().tables:
+        rows = table.extract()
+        if not any(cell for row in rows for cell in row):
+            continue
+        tables.append({"rows": rows, "bbox": [round(float(v), 2) for v in table.bbox]})
+    return tables
+
+
+def _find_tables_in_pages(pdf_path: str, page_numbers: List[int]) -> Tuple[List[Tuple[int, List[Dict[str, Any]]]], float]:
+    """
+    find_page_tables for some 1-based pages of a PDF, plus the wall time.
+    Top-level function so it can run in a worker process (opens the PDF itself).
+    A page that fails is reported and skipped, the others are still returned.
+    """
+    started = time.perf_counter()
+    results: List[Tuple[int, List[Dict[str, Any]]]] = []
+    document = open_pdf(Path(pdf_path))
+    try:
+        for page_number in page_numbers:
+            try:
+                results.append((page_number, find_page_tables(document[page_number - 1])))
+            except Exception as e:
+                print(f"[WARN] Table extraction failed on page {page_number} of {pdf_path}: {e}")
+    finally:
+        document.close()
+    return results, time.perf_counter() - started
+
+
+def _traced_table_result(result: Tuple[List[Tuple[int, List[Dict[str, Any]]]], float]) -> List[Tuple[int, List[Dict[str, Any]]]]:
+    page_tables, seconds = result
+    tracer.record("table_extract", seconds, items=len(page_tables))
+    return page_tables
+
+
+def make_table_chunks(
+    doc_id: str,
+    page_number: int,
+    tables: List[Dict[str, Any]],
+    make_id: ChunkIdAllocator,
+) -> List[DocumentChunk]:
+    """
+    One DocumentChunk (modality='table', CSV content) per table of a page.
+    """
+    chunks: List[DocumentChunk] = []
+    for table_index, table in enumerate(tables):
+        table_text = table_rows_to_text(table["rows"])
+        chunks.append(
+            DocumentChunk(
+                id=make_id(doc_id, "table", page_number, table_text),
                 doc_id=doc_id,
-                modality="image_ocr",
-                page=page_index + 1,
-                content=ocr_text,
-                extra={"image_index": img_index},
+                modality="table",
+                page=page_number,
+                content=table_text,
+                extra={
+                    "n_rows": len(table["rows"]),
+                    "n_cols": max((len(row) for row in table["rows"]), default=0),
+                    "bbox": table["bbox"],
+                    "table_index": table_index,
+                },
             )
-            chunks.append(chunk)
-
+        )
     return chunks
 
+
+def has_pymupdf_table_finder() -> bool:
+    """
+    True if the installed PyMuPDF has page.find_tables (PyMuPDF >= 1.23).
+    """
+    import fitz  # PyMuPDF
+
+    return hasattr(fitz.Page, "find_tables")
+
+
 def extract_table_chunks(
     pdf_name: str = "sample.pdf",
     doc_id: str = "sample_doc",
+    max_workers: Optional[int] = None,
 ) -> List[DocumentChunk]:
     """
-    Extracts tables from the PDF using tabula-py and converts them
-    into DocumentChunk objects with modality='table'.
+    Extracts tables from the PDF and converts them into DocumentChunk
+    objects with modality='table', in page order, with their page number
+    and bounding box (extra["bbox"], PDF points).
+
+    Batches of TABLE_PAGE_BATCH pages are processed in parallel worker
+    processes. Falls back to tabula if PyMuPDF has no table finder.
+    """
+    pdf_path = Path(RAW_DOCS_DIR) / pdf_name
+
+    if not pdf_path.exists():
+        raise FileNotFoundError(f"PDF not found at: {pdf_path}")
+
+    if not has_pymupdf_table_finder():
+        return extract_table_chunks_with_tabula(pdf_name=pdf_name, doc_id=doc_id)
+
+    document = open_pdf(pdf_path)
+    n_pages = len(document)
+    document.close()
+
+    page_batches = [
+        list(range(first, min(first + TABLE_PAGE_BATCH, n_pages + 1)))
+        for first in range(1, n_pages + 1, TABLE_PAGE_BATCH)
+    ]
+    max_workers = min(max_workers or DEFAULT_OCR_WORKERS, len(page_batches))
+
+    if max_workers <= 1:
+        results = [_find_tables_in_pages(str(pdf_path), pages) for pages in page_batches]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_find_tables_in_pages, [str(pdf_path)] * len(page_batches), page_batches))
+
+    chunks: List[DocumentChunk] = []
+    make_id = ChunkIdAllocator()
+    for result in results:
+        for page_number, tables in _traced_table_result(result):
+            chunks.extend(make_table_chunks(doc_id, page_number, tables, make_id))
+    return chunks
+
+
+def extract_table_chunks_with_tabula(
+    pdf_name: str = "sample.pdf",
+    doc_id: str = "sample_doc",
+) -> List[DocumentChunk]:
+    """
+    Fallback table extraction with tabula-py (runs a Java process over the
+    whole file; page numbers are not known, so page=-1).
+    Returns [] with a warning if tabula is missing or fails.
     """
     pdf_path = Path(RAW_DOCS_DIR) / pdf_name
 
@@ -136,22 +612,27 @@ def extract_table_chunks(
 
     # tabula returns a list of DataFrames
     try:
-        dfs = tabula.read_pdf(str(pdf_path), pages="all", multiple_tables=True)
+        import tabula
+
+        with span("tabula") as tabula_span:
+            dfs = tabula.read_pdf(str(pdf_path), pages="all", multiple_tables=True)
+            tabula_span.items = len(dfs)
     except Exception as e:
-        print(f"[WARN] Table extraction failed: {e}")
+        print(f"[WARN] Table extraction with tabula failed: {e}")
         return []
 
     chunks: List[DocumentChunk] = []
+    make_id = ChunkIdAllocator()
 
     for idx, df in enumerate(dfs):
         # Convert DataFrame to a readable text representation
         table_text = df.to_csv(index=False)
 
         chunk = DocumentChunk(
-            id=f"table_{idx}",
+            id=make_id(doc_id, "table", -1, table_text),
             doc_id=doc_id,
             modality="table",
-            page=-1,  # tabula doesn't always give page; you can refine later
+            page=-1,  # tabula doesn't give the page
             content=table_text,
             extra={"n_rows": df.shape[0], "n_cols": df.shape[1]},
         )
@@ -160,6 +641,162 @@ def extract_table_chunks(
     return chunks
 
 
+def iter_pdf_chunks(
+    pdf_name: str = "sample.pdf",
+    doc_id: str = "sample_doc",
+    max_tokens: int = DEFAULT_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    ocr_workers: Optional[int] = None,
+    include_tables: bool = True,
+    progress: Optional[Callable[[Dict[str, int]], None]] = None,
+) -> Iterator[DocumentChunk]:
+    """
+    Single pass over the PDF that yields chunks as soon as they exist:
+    - text chunks every TEXT_PAGE_BATCH pages (one tokenizer call per batch),
+    - OCR chunks as their images come back from the OCR pool,
+    - table chunks per page; with a worker pool, pages are sent in batches of
+      TABLE_PAGE_BATCH to the pool and their tables are yielded at the end.
+
+    Nothing is collected up front, so the caller can embed in batches while
+    later pages are still being parsed. At most ~2 OCR jobs per worker are
+    in flight at once, which bounds memory for image-heavy documents.
+
+    `progress`, if given, is called after every page with
+    {"pages_done", "n_pages", "ocr_queue"} (OCR jobs still in flight).
+    """
+    pdf_path = Path(RAW_DOCS_DIR) / pdf_name
+
+    if not pdf_path.exists():
+        raise FileNotFoundError(f"PDF not found at: {pdf_path}")
+
+    ocr_workers = ocr_workers or DEFAULT_OCR_WORKERS
+    pool = ProcessPoolExecutor(max_workers=ocr_workers) if ocr_workers > 1 else None
+
+    text_ids = ChunkIdAllocator()
+    ocr_ids = ChunkIdAllocator()
+    known_xrefs: Dict[int, Optional[str]] = {}
+    ocr_jobs: Dict[str, Future] = {}  # digest -> OCR future (or finished text)
+    ocr_results: Dict[str, Optional[str]] = {}
+    pending: deque = deque()  # (page_number, image_index, digest), in page order
+    text_pages: List[Tuple[int, str]] = []  # (page_number, text) not chunked yet
+    table_ids = ChunkIdAllocator()
+    find_tables = include_tables and has_pymupdf_table_finder()
+    table_pages: List[int] = []  # pages not yet sent to the pool for tables
+    table_jobs: List[Future] = []
+
+    def _submit_table_pages() -> None:
+        if table_pages:
+            table_jobs.append(pool.submit(_find_tables_in_pages, str(pdf_path), list(table_pages)))
+            table_pages.clear()
+
+    def _page_table_chunks(page, page_number: int) -> List[DocumentChunk]:
+        try:
+            with span("table_extract", items=1):
+                tables = find_page_tables(page)
+        except Exception as e:
+            print(f"[WARN] Table extraction failed on page {page_number} of {pdf_name}: {e}")
+            return []
+        return make_table_chunks(doc_id, page_number, tables, table_ids)
+
+    def _chunk_text_pages() -> List[DocumentChunk]:
+        chunks = chunk_pages(
+            doc_id, text_pages, max_tokens=max_tokens, overlap_tokens=overlap_tokens, make_id=text_ids
+        )
+        text_pages.clear()
+        return chunks
+
+    def _flush(max_in_flight: int) -> Iterator[DocumentChunk]:
+        # Emit OCR chunks in page order. Stop at the first unfinished job,
+        # unless more than max_in_flight jobs are queued (then wait for it).
+        while pending:
+            page_number, img_index, digest = pending[0]
+            if digest not in ocr_results:
+                job = ocr_jobs[digest]
+                if not job.done() and len(ocr_jobs) <= max_in_flight:
+                    return
+                ocr_results[digest] = _traced_ocr_result(job.result())
+                del ocr_jobs[digest]
+            pending.popleft()
+            chunk = make_ocr_chunk(
+                doc_id, page_number, img_index, digest, ocr_results[digest], ocr_ids
+            )
+            if chunk is not None:
+                yield chunk
+
+    try:
+        document = open_pdf(pdf_path)
+        try:
+            for page_index in range(len(document)):
+                page = document[page_index]
+                page_number = page_index + 1
+
+                # 1) Page text → text chunks, a batch of pages at a time
+                with span("text_extract", items=1):
+                    page_text = page.get_text()
+                text_pages.append((page_number, page_text))
+                if len(text_pages) >= TEXT_PAGE_BATCH:
+                    yield from _chunk_text_pages()
+
+                # 2) Images (or the page render, if scanned) → OCR jobs, after triage
+                page_images, new_images = collect_page_ocr_inputs(document, page, known_xrefs, page_text)
+                for digest, image_bytes in new_images.items():
+                    # A new xref (or page render) can still carry bytes OCR'd earlier
+                    if digest in ocr_results or digest in ocr_jobs:
+                        continue
+                    if pool is not None:
+                        ocr_jobs[digest] = pool.submit(_ocr_image_bytes_timed, image_bytes)
+                    else:
+                        ocr_results[digest] = _traced_ocr_result(_ocr_image_bytes_timed(image_bytes))
+                for img_index, digest in page_images:
+                    pending.append((page_number, img_index, digest))
+
+                # 3) Tables → table chunks (in the pool, or right here on the open page)
+                if find_tables:
+                    if pool is not None:
+                        table_pages.append(page_number)
+                        if len(table_pages) >= TABLE_PAGE_BATCH:
+                            _submit_table_pages()
+                    else:
+                        yield from _page_table_chunks(page, page_number)
+
+                # Back-pressure: don't run too far ahead of the OCR pool
+                yield from _flush(max_in_flight=2 * ocr_workers)
+
+                if progress is not None:
+                    progress({"pages_done": page_number, "n_pages": len(document), "ocr_queue": len(ocr_jobs)})
+        finally:
+            document.close()
+
+        if find_tables and pool is not None:
+            _submit_table_pages()
+        yield from _chunk_text_pages()
+        yield from _flush(max_in_flight=0)
+        for job in table_jobs:
+            for page_number, tables in _traced_table_result(job.result()):
+                yield from make_table_chunks(doc_id, page_number, tables, table_ids)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # Old PyMuPDF without a table finder: tabula over the whole file
+    if include_tables and not find_tables:
+        yield from extract_table_chunks_with_tabula(pdf_name=pdf_name, doc_id=doc_id)
+
+
+def save_pdf_chunks_single_process(pdf_name: str, doc_id: str, folder: str, batch_size: int = 256) -> int:
+    """
+    Extract all chunks of one PDF, with OCR run inline (no OCR pool), and
+    save them as a ChunkStore in `folder`. Returns the number of chunks.
+    Meant for corpus workers that already run one process per document:
+    the parent memory-maps the store instead of receiving every chunk
+    pickled, and only compact columns are held here, batch by batch.
+    Lives here (not in qa_pipeline) so worker processes don't load the LLM.
+    """
+    chunks = iter_pdf_chunks(pdf_name=pdf_name, doc_id=doc_id, ocr_workers=1)
+    store = ChunkStore.concat([ChunkStore.from_chunks(batch) for batch in iter_batches(chunks, batch_size)])
+    store.save(Path(folder))
+    return len(store)
+
 
 if __name__ == "__main__":
     # simple manual test
@@ -0,0 +1,292 @@
+"""
+BM25 lexical index over chunk texts, pure NumPy.
+
+Dense MiniLM embeddings are weak on exact tokens (acronyms like "NPL" or
+"LNG", years, figures); BM25 matches them literally. Used by
+app.index for mode="lexical" and mode="hybrid".
+
+Layout (CSR, one row of postings per term):
+- vocab:       term -> term id
+- idf:         float32 (V,)
+- doc_lengths: float32 (N,) number of tokens per chunk
+- indptr:      int64 (V + 1,), postings of term t are indptr[t]:indptr[t + 1]
+- rows:        int32 (nnz,) chunk rows containing the term
+- weights:     float32 (nnz,) precomputed BM25 term weight of that posting
+- tfs:         float32 (nnz,) term frequency of that posting
+
+Since k1 and b are fixed at build time, the whole BM25 formula is folded
+into `weights`: scoring a query is one slice-and-add per query term.
+
+The term frequencies are kept so that an update (update_lexical_index,
+select_lexical_rows) only tokenizes the changed rows: IDF and weights are
+then recomputed from `tfs` in a few vectorized passes. save_lexical_index /
+load_lexical_index store the arrays next to the index, memory-mapped on load.
+"""
+
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import os
+import re
+
+import numpy as np
+
+# Standard BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Alphanumeric runs ("lng", "2023", "q3"), keeping decimal / thousands
+# separators inside numbers ("3.5", "2,000")
+_TOKEN_RE = re.compile(r"[^\W_]+(?:[.,]\d+)*")
+
+# Very common English words carry no signal and have long posting lists
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were what which who will with".split()
+)
+
+# File names inside an index folder
+_ARRAY_FILES = {
+    "idf": "lexical_idf.npy",
+    "doc_lengths": "lexical_doc_lengths.npy",
+    "indptr": "lexical_indptr.npy",
+    "rows": "lexical_rows.npy",
+    "weights": "lexical_weights.npy",
+    "tfs": "lexical_tfs.npy",
+}
+_META_FILE = "lexical_vocab.json"
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word / number tokens, stopwords removed.
+    """
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def _tokenize_rows(texts: Iterable[str]) -> Tuple[List[str], List[int]]:
+    # One flat token list for all texts, plus the number of tokens of each
+    all_tokens: List[str] = []
+    lengths: List[int] = []
+    for text in texts:
+        tokens = tokenize(text)
+        lengths.append(len(tokens))
+        all_tokens.extend(tokens)
+    return all_tokens, lengths
+
+
+def _count_postings(
+    token_ids: np.ndarray,
+    token_rows: np.ndarray,
+    n_rows: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # (term, row) pairs with their term frequency, sorted by term then row
+    pair_keys, tfs = np.unique(token_ids * max(n_rows, 1) + token_rows, return_counts=True)
+    terms = (pair_keys // max(n_rows, 1)).astype(np.int32)
+    rows = (pair_keys % max(n_rows, 1)).astype(np.int32)
+    return terms, rows, tfs.astype(np.float32)
+
+
+def _finish_lexical_index(
+    vocab: Dict[str, int],
+    terms: np.ndarray,
+    rows: np.ndarray,
+    tfs: np.ndarray,
+    lengths: np.ndarray,
+    n_live: int,
+    k1: float,
+    b: float,
+) -> Dict[str, Any]:
+    # CSR layout, IDF and BM25 weights from postings sorted by term
+    doc_freq = np.bincount(terms, minlength=len(vocab))
+    indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(doc_freq, out=indptr[1:])
+
+    # Lucene-style IDF, always positive
+    idf = np.log1p((n_live - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+
+    avg_length = float(lengths.sum() / n_live) if n_live else 0.0
+    norm = k1 * (1.0 - b + b * lengths[rows] / avg_length) if avg_length else np.full(rows.shape, k1, dtype=np.float32)
+    weights = (idf[terms] * tfs * (k1 + 1.0) / (tfs + norm)).astype(np.float32)
+
+    return {
+        "vocab": vocab,
+        "idf": idf,
+        "doc_lengths": lengths,
+        "avg_length": avg_length,
+        "indptr": indptr,
+        "rows": rows,
+        "weights": weights,
+        "tfs": tfs,
+        "n_rows": len(lengths),
+        "k1": k1,
+        "b": b,
+    }
+
+
+def _posting_terms(lexical: Dict[str, Any]) -> np.ndarray:
+    # Term id of every posting (the CSR row index, expanded)
+    indptr = np.asarray(lexical["indptr"])
+    return np.repeat(np.arange(len(indptr) - 1, dtype=np.int32), np.diff(indptr))
+
+
+def build_lexical_index(
+    texts: Iterable[str],
+    deleted: Optional[np.ndarray] = None,
+    k1: float = BM25_K1,
+    b: float = BM25_B,
+) -> Dict[str, Any]:
+    """
+    Build the BM25 index (see module docstring) for `texts`, one per row.
+    Rows flagged in `deleted` get no postings and don't count towards IDF.
+    """
+    if deleted is not None:
+        texts = ("" if deleted[row] else text for row, text in enumerate(texts))
+    all_tokens, doc_lengths = _tokenize_rows(texts)
+
+    # Term ids in order of first appearance (map/fromkeys keep the per-token work in C)
+    vocab: Dict[str, int] = {term: term_id for term_id, term in enumerate(dict.fromkeys(all_tokens))}
+    token_ids = np.fromiter(map(vocab.__getitem__, all_tokens), dtype=np.int64, count=len(all_tokens))
+    del all_tokens
+
+    n_rows = len(doc_lengths)
+    n_live = n_rows - (int(np.count_nonzero(deleted[:n_rows])) if deleted is not None else 0)
+    token_rows = np.repeat(np.arange(n_rows, dtype=np.int64), np.asarray(doc_lengths, dtype=np.int64))
+    terms, rows, tfs = _count_postings(token_ids, token_rows, n_rows)
+
+    lengths = np.asarray(doc_lengths, dtype=np.float32)
+    return _finish_lexical_index(vocab, terms, rows, tfs, lengths, n_live, k1, b)
+
+
+def update_lexical_index(
+    lexical: Dict[str, Any],
+    rows: np.ndarray,
+    texts: List[str],
+    deleted: np.ndarray,
+) -> Dict[str, Any]:
+    """
+    BM25 index after some rows changed, without re-tokenizing the others:
+    - `rows` (appended past the end, or revived) get postings for `texts`
+    - rows flagged in `deleted` lose theirs
+    IDF and weights are recomputed for the new set of live rows.
+    Returns a new dict; `lexical` itself is not modified, so an index
+    copy sharing it can keep searching.
+    """
+    n_rows = len(deleted)
+    rows = np.asarray(rows, dtype=np.int64)
+
+    # STEP 1: keep the postings of rows that are still live and unchanged
+    drop = np.array(deleted, dtype=bool)
+    drop[rows] = True
+    old_rows = np.asarray(lexical["rows"])
+    keep = ~drop[old_rows]
+    old_terms = _posting_terms(lexical)[keep]
+
+    lengths = np.zeros(n_rows, dtype=np.float32)
+    n_old = min(int(lexical["n_rows"]), n_rows)
+    lengths[:n_old] = np.asarray(lexical["doc_lengths"])[:n_old]
+
+    # STEP 2: postings of the changed rows, new terms appended to the vocab
+    all_tokens, new_lengths = _tokenize_rows(texts)
+    vocab = dict(lexical["vocab"])
+    for term in dict.fromkeys(all_tokens):
+        if term not in vocab:
+            vocab[term] = len(vocab)
+    token_ids = np.fromiter(map(vocab.__getitem__, all_tokens), dtype=np.int64, count=len(all_tokens))
+    token_rows = np.repeat(rows, np.asarray(new_lengths, dtype=np.int64))
+    new_terms, new_rows, new_tfs = _count_postings(token_ids, token_rows, n_rows)
+    lengths[rows] = new_lengths
+    lengths[deleted] = 0
+
+    # STEP 3: merge; the kept postings are already sorted, so the stable
+    # sort only has to slot the few new ones in
+    terms = np.concatenate([old_terms, new_terms])
+    order = np.argsort(terms, kind="stable")
+    terms = terms[order]
+    all_rows = np.concatenate([old_rows[keep], new_rows])[order]
+    tfs = np.concatenate([np.asarray(lexical["tfs"])[keep], new_tfs])[order]
+
+    n_live = n_rows - int(np.count_nonzero(deleted))
+    return _finish_lexical_index(vocab, terms, all_rows, tfs, lengths, n_live, lexical["k1"], lexical["b"])
+
+
+def select_lexical_rows(lexical: Dict[str, Any], keep: np.ndarray) -> Dict[str, Any]:
+    """
+    BM25 index restricted to the rows in `keep` (sorted), renumbered
+    0..len(keep)-1, e.g. after compacting the index. Returns a new dict.
+    """
+    remap = np.full(int(lexical["n_rows"]), -1, dtype=np.int64)
+    remap[keep] = np.arange(len(keep))
+    rows = remap[np.asarray(lexical["rows"])]
+    mask = rows >= 0
+
+    lengths = np.asarray(lexical["doc_lengths"])[keep].astype(np.float32)
+    return _finish_lexical_index(
+        lexical["vocab"],
+        _posting_terms(lexical)[mask],
+        rows[mask].astype(np.int32),
+        np.asarray(lexical["tfs"])[mask],
+        lengths,
+        len(keep),
+        lexical["k1"],
+        lexical["b"],
+    )
+
+
+def save_lexical_index(lexical: Dict[str, Any], folder: Path) -> None:
+    """
+    Write the BM25 arrays and vocab into an index folder.
+    """
+    folder = Path(folder)
+    # Temp files swapped in, as in ChunkStore.save
+    for key, file_name in _ARRAY_FILES.items():
+        tmp_path = folder / (file_name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(lexical[key]))
+        os.replace(tmp_path, folder / file_name)
+
+    # Terms in id order, so ids are just list positions on load
+    terms = [""] * len(lexical["vocab"])
+    for term, term_id in lexical["vocab"].items():
+        terms[term_id] = term
+    meta = {"k1": lexical["k1"], "b": lexical["b"], "avg_length": lexical["avg_length"], "terms": terms}
+    with open(folder / _META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def load_lexical_index(folder: Path, mmap: bool = True) -> Dict[str, Any]:
+    """
+    Load BM25 arrays written by save_lexical_index (memory-mapped by default).
+    """
+    folder = Path(folder)
+    mmap_mode = "r" if mmap else None
+    lexical: Dict[str, Any] = {}
+    for key, file_name in _ARRAY_FILES.items():
+        try:
+            lexical[key] = np.load(folder / file_name, mmap_mode=mmap_mode)
+        except ValueError:
+            # Empty arrays can't be memory-mapped
+            lexical[key] = np.load(folder / file_name)
+    with open(folder / _META_FILE, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    lexical["vocab"] = {term: term_id for term_id, term in enumerate(meta["terms"])}
+    lexical.update(k1=meta["k1"], b=meta["b"], avg_length=meta["avg_length"], n_rows=len(lexical["doc_lengths"]))
+    return lexical
+
+
+def bm25_scores(lexical: Dict[str, Any], query: str) -> np.ndarray:
+    """
+    BM25 score of every row for `query`, as a float32 array (N,).
+    Rows sharing no term with the query score 0.
+    """
+    scores = np.zeros(lexical["n_rows"], dtype=np.float32)
+    indptr = lexical["indptr"]
+    for term, query_tf in Counter(tokenize(query)).items():
+        term_id = lexical["vocab"].get(term)
+        if term_id is None:
+            continue
+        start, end = indptr[term_id], indptr[term_id + 1]
+        # Rows are unique within a posting list, so a plain fancy-index add is safe
+        scores[lexical["rows"][start:end]] += query_tf * lexical["weights"][start:end]
+    return scores
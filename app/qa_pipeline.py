@@ -2,73 +2,278 @@
 Question-answering pipeline (LOCAL MODEL - text-only RAG).
 
 Steps:
-- Build an index from a PDF (using previous steps).
+- Build an index from a PDF (using previous steps),
+  or from every PDF in data/raw_docs (build_corpus_index).
 - For a user query:
     - Retrieve top-k similar chunks
     - Format them as context
     - Run a local model (FLAN-T5) to generate an answer
 """
 
-from typing import List, Dict, Any, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Tuple, Optional, Iterable, Iterator, Callable
+import os
+import queue
+import tempfile
+import threading
+import time
+
+from app.config import RAW_DOCS_DIR
+from app.ingestion import iter_pdf_chunks, save_pdf_chunks_single_process
+from app.chunk_store import ChunkStore
+
+from app.index import (
+    build_text_index_from_stream,
+    search_text_index_batch,
+    get_query_embedding_cache_stats,
+    search_text_index,
+    resolve_search_mode,
+    save_text_index,
+    load_text_index,
+    index_exists,
+    replace_doc_in_index,
+    get_index_version,
+)
+from app.embeddings import get_text_embedding_model
+from app.models import DocumentChunk
+from app.tracing import span, tracer, format_trace_summary
+from app.utils import LRUCache
 
-from transformers import pipeline
 
-from app.ingestion import get_pdf_page_texts, extract_image_ocr_chunks, extract_table_chunks
+LOCAL_LLM_MODEL_NAME = "google/flan-t5-base"
 
-from app.chunking import chunk_pdf_pages_to_document_chunks
-from app.index import build_text_index, search_text_index
-from app.models import DocumentChunk
+# Generation length limit, the same for every answer path (the answer
+# cache is shared between them)
+GENERATION_MAX_NEW_TOKENS = 256
 
+# stream_answer gives up if the model produces no text for this long
+STREAM_TOKEN_TIMEOUT_S = 120.0
 
-# Load local model ONCE (this may take time the first time)
-print("⏳ Loading local LLM: google/flan-t5-base (first time may be slow)...")
-local_llm = pipeline(
-    "text2text-generation",
-    model="google/flan-t5-base",
-    max_length=256
-)
-print("✅ Local LLM loaded successfully!")
+# Loaded lazily (on first question or by warm_up_models), not at import time
+_local_llm = None
+_local_llm_lock = threading.Lock()
 
 
-def build_qa_index_from_pdf(
+def get_local_llm():
+    """
+    Returns the local text2text pipeline, loading it ONCE on first use
+    (this may take time the first time).
+    """
+    global _local_llm
+    if _local_llm is None:
+        with _local_llm_lock:
+            if _local_llm is None:
+                from transformers import pipeline
+
+                print(f"⏳ Loading local LLM: {LOCAL_LLM_MODEL_NAME} (first time may be slow)...")
+                _local_llm = pipeline(
+                    "text2text-generation",
+                    model=LOCAL_LLM_MODEL_NAME,
+                    max_new_tokens=GENERATION_MAX_NEW_TOKENS,
+                )
+                print("✅ Local LLM loaded successfully!")
+    return _local_llm
+
+
+def warm_up_models(background: bool = True) -> Optional[threading.Thread]:
+    """
+    Load the embedding model and the local LLM ahead of the first question.
+    With background=True this runs on a daemon thread and returns it,
+    so e.g. the Streamlit UI can render while the models load.
+    """
+    def _load():
+        get_text_embedding_model()
+        get_local_llm()
+
+    if not background:
+        _load()
+        return None
+
+    thread = threading.Thread(target=_load, name="model-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+# (index version, query, top_k, filters, mode) -> (answer, chunks).
+# The index version changes on every modification, so stale answers are never hit.
+ANSWER_CACHE_SIZE = 1024
+_answer_cache = LRUCache(maxsize=ANSWER_CACHE_SIZE)
+
+
+def _count_modalities(chunks: Iterable[DocumentChunk], counts: Dict[str, int]) -> Iterator[DocumentChunk]:
+    # Pass chunks through unchanged, counting them per modality on the way
+    for chunk in chunks:
+        counts[chunk.modality] = counts.get(chunk.modality, 0) + 1
+        yield chunk
+
+
+def _print_modality_counts(counts: Dict[str, int]) -> None:
+    print(
+        f"Text chunks: {counts.get('text', 0)}, "
+        f"OCR chunks: {counts.get('image_ocr', 0)}, "
+        f"Table chunks: {counts.get('table', 0)}, "
+        f"Total: {sum(counts.values())}"
+    )
+
+
+def extract_pdf_chunks(
     pdf_name: str = "qatar_test_doc.pdf",
     doc_id: str = "qatar_report",
-) -> Dict[str, Any]:
-
+    progress: Optional[Callable[[Dict[str, int]], None]] = None,
+) -> List[DocumentChunk]:
     """
     Reads the PDF -> creates:
       - text chunks (from page text)
       - image_ocr chunks (from images via OCR)
-    Then builds a single vector index over ALL chunks.
+      - table chunks (from tables)
+    Returns all of them, ready to be embedded.
+    `progress` is passed to iter_pdf_chunks (called after every page).
     """
-    # 1) Page text → text chunks
-    page_texts = get_pdf_page_texts(pdf_name)
-    text_chunks = chunk_pdf_pages_to_document_chunks(doc_id, page_texts, max_words=200)
-
-    # 2) Images → OCR chunks
-    ocr_chunks = extract_image_ocr_chunks(pdf_name=pdf_name, doc_id=doc_id)
+    counts: Dict[str, int] = {}
+    all_chunks = list(
+        _count_modalities(iter_pdf_chunks(pdf_name=pdf_name, doc_id=doc_id, progress=progress), counts)
+    )
+    _print_modality_counts(counts)
+    return all_chunks
 
-    # 3) Tables → table chunks
-    table_chunks = extract_table_chunks(pdf_name=pdf_name, doc_id=doc_id)
 
-    # 4) Combine all chunks
-    all_chunks = text_chunks + ocr_chunks + table_chunks
+def build_qa_index_from_pdf(
+    pdf_name: str = "qatar_test_doc.pdf",
+    doc_id: str = "qatar_report",
+    batch_size: int = 256,
+    progress: Optional[Callable[[Dict[str, int]], None]] = None,
+) -> Dict[str, Any]:
 
-    print(
-        f"Text chunks: {len(text_chunks)}, "
-        f"OCR chunks: {len(ocr_chunks)}, "
-        f"Table chunks: {len(table_chunks)}, "
-        f"Total: {len(all_chunks)}"
+    """
+    Streams all chunks out of the PDF (text, OCR, tables) in a single pass
+    and builds a single vector index over ALL of them, embedding
+    `batch_size` chunks at a time while the rest of the PDF is still being read.
+    `progress` is passed to iter_pdf_chunks (called after every page).
+    """
+    counts: Dict[str, int] = {}
+    chunk_stream = _count_modalities(
+        iter_pdf_chunks(pdf_name=pdf_name, doc_id=doc_id, progress=progress), counts
     )
+    index = build_text_index_from_stream(chunk_stream, batch_size=batch_size)
+    _print_modality_counts(counts)
+    print("⏱ Time per stage (this process so far):")
+    print(format_trace_summary())
+    return index
+
+
+def doc_id_for_pdf(pdf_name: str) -> str:
+    """
+    doc_id used for a PDF in a corpus index: the file name without extension.
+    """
+    return Path(pdf_name).stem
+
 
+def list_corpus_pdfs() -> List[str]:
+    """
+    Names of all PDFs in data/raw_docs, sorted.
+    """
+    return sorted(p.name for p in Path(RAW_DOCS_DIR).glob("*.pdf"))
+
+
+def _iter_corpus_chunks(
+    pdf_names: List[str],
+    max_workers: int,
+    counts: Dict[str, int],
+) -> Iterator[DocumentChunk]:
+    # Workers save each document's chunks to disk; they are read back
+    # memory-mapped, a row at a time, so the parent never holds a whole
+    # document's chunks (let alone all of them) before embedding
+    with tempfile.TemporaryDirectory(prefix="corpus_chunks_", ignore_cleanup_errors=True) as tmp_dir:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = []
+            for i, pdf_name in enumerate(pdf_names):
+                folder = Path(tmp_dir) / str(i)
+                folder.mkdir()
+                job = pool.submit(save_pdf_chunks_single_process, pdf_name, doc_id_for_pdf(pdf_name), str(folder))
+                futures.append((pdf_name, folder, job))
+
+            # Documents are extracted concurrently but merged in a fixed order
+            for pdf_name, folder, future in futures:
+                try:
+                    counts[pdf_name] = future.result()
+                except Exception as e:
+                    print(f"[WARN] Skipping {pdf_name}: {e}")
+                    continue
+                yield from ChunkStore.load(folder, mmap=True)
+
+
+def build_corpus_index(
+    pdf_names: Optional[List[str]] = None,
+    max_workers: Optional[int] = None,
+    batch_size: int = 256,
+) -> Dict[str, Any]:
+    """
+    Build ONE index over many PDFs (default: every PDF in data/raw_docs).
+    Each document is extracted in its own worker process; chunks are
+    embedded in batches as documents finish. Each document's doc_id is its
+    file name without extension, usable as a `doc_ids` filter when searching.
+    """
+    pdf_names = pdf_names if pdf_names is not None else list_corpus_pdfs()
+    if not pdf_names:
+        raise ValueError(f"No PDFs found in {RAW_DOCS_DIR}")
 
-    print(f"Text chunks: {len(text_chunks)}, OCR chunks: {len(ocr_chunks)}, total: {len(all_chunks)}")
+    max_workers = max_workers or min(len(pdf_names), os.cpu_count() or 1)
 
-    # 4) Build index over all of them
-    index = build_text_index(all_chunks)
+    counts: Dict[str, int] = {}
+    index = build_text_index_from_stream(
+        _iter_corpus_chunks(pdf_names, max_workers, counts), batch_size=batch_size
+    )
+    print(f"Corpus index: {len(counts)} documents, {sum(counts.values())} chunks.")
     return index
 
 
+def update_qa_index_with_pdf(
+    index: Dict[str, Any],
+    pdf_name: str,
+    doc_id: str,
+    progress: Optional[Callable[[Dict[str, int]], None]] = None,
+) -> Dict[str, int]:
+    """
+    Add a new PDF to an existing index, or replace an older version of it.
+    Only chunks that are new or changed get embedded.
+    Returns counts: {"kept", "added", "deleted"}.
+    """
+    all_chunks = extract_pdf_chunks(pdf_name=pdf_name, doc_id=doc_id, progress=progress)
+    counts = replace_doc_in_index(index, doc_id, all_chunks)
+    print(
+        f"Updated '{doc_id}': kept {counts['kept']}, "
+        f"added {counts['added']}, deleted {counts['deleted']} chunks."
+    )
+    return counts
+
+
+def load_or_build_qa_index(
+    pdf_name: str = "qatar_test_doc.pdf",
+    doc_id: str = "qatar_report",
+    index_name: Optional[str] = None,
+    rebuild: bool = False,
+) -> Dict[str, Any]:
+    """
+    Load the saved index for this document from data/indexes/ if it exists,
+    otherwise build it from the PDF and save it for next time.
+    The index name defaults to the doc_id.
+    """
+    index_name = index_name or doc_id
+
+    if not rebuild and index_exists(index_name):
+        try:
+            index = load_text_index(index_name)
+            print(f"Loaded saved index '{index_name}' ({len(index['chunks'])} chunks).")
+            return index
+        except (ValueError, OSError) as e:
+            print(f"[WARN] Saved index '{index_name}' is not usable ({e}), rebuilding.")
+
+    index = build_qa_index_from_pdf(pdf_name=pdf_name, doc_id=doc_id)
+    index_dir = save_text_index(index, index_name)
+    print(f"Saved index '{index_name}' to {index_dir}")
+    return index
+
 
 def format_context_for_prompt(chunks: List[DocumentChunk]) -> str:
     """
@@ -87,43 +292,306 @@ def format_context_for_prompt(chunks: List[DocumentChunk]) -> str:
 
 
 
+NO_CONTEXT_ANSWER = "I couldn't find any relevant information in the document."
+
+
+def build_prompt(context_text: str, query: str) -> str:
+    """
+    Final prompt sent to the local model.
+    """
+    return f"""
+You are a helpful assistant. Use ONLY the context below to answer the question.
+
+Context:
+{context_text}
+
+Question:
+{query}
+
+If the answer is not in the context, say:
+"I cannot find this information in the document."
+
+Answer:
+"""
+
+
+def _answer_cache_key(
+    index: Dict[str, Any],
+    query: str,
+    top_k: int,
+    doc_ids: Optional[List[str]],
+    mode: str = "dense",
+    modalities: Optional[List[str]] = None,
+    page_range: Optional[Tuple[int, int]] = None,
+    max_new_tokens: int = GENERATION_MAX_NEW_TOKENS,
+) -> Tuple:
+    return (
+        get_index_version(index),
+        query,
+        top_k,
+        tuple(sorted(set(doc_ids))) if doc_ids is not None else None,
+        mode,
+        tuple(sorted(set(modalities))) if modalities is not None else None,
+        tuple(page_range) if page_range is not None else None,
+        max_new_tokens,
+    )
+
+
 def answer_question(
     index: Dict[str, Any],
     query: str,
     top_k: int = 5,
+    doc_ids: Optional[List[str]] = None,
+    mode: str = "dense",
+    modalities: Optional[List[str]] = None,
+    page_range: Optional[Tuple[int, int]] = None,
 ) -> Tuple[str, List[DocumentChunk]]:
     """
-    Core QA function using LOCAL AI model
+    Core QA function using LOCAL AI model.
+    `doc_ids`, `modalities` and `page_range` restrict retrieval to matching
+    chunks, `mode` is the retrieval mode ("dense", "lexical", "hybrid",
+    "auto"); see search_text_index in app/index.py.
+
+    Answers are cached per (index version, query, top_k, filters, mode),
+    so repeated questions skip retrieval and generation entirely.
     """
+    mode = resolve_search_mode(mode)
+    cache_key = _answer_cache_key(index, query, top_k, doc_ids, mode, modalities, page_range)
+    cached = _answer_cache.get(cache_key)
+    if cached is not None:
+        answer_text, cached_chunks = cached
+        return answer_text, list(cached_chunks)
+
     # 1. Retrieve top-k chunks
-    results = search_text_index(index, query, top_k=top_k)
+    results = search_text_index(
+        index, query, top_k=top_k, doc_ids=doc_ids, mode=mode,
+        modalities=modalities, page_range=page_range,
+    )
     retrieved_chunks = [chunk for score, chunk in results]
 
     if not retrieved_chunks:
-        return "I couldn't find any relevant information in the document.", []
+        return NO_CONTEXT_ANSWER, []
 
     # 2. Format context
     context_text = format_context_for_prompt(retrieved_chunks)
 
     # 3. Build final prompt for the LOCAL model
-    final_prompt = f"""
-You are a helpful assistant. Use ONLY the context below to answer the question.
+    final_prompt = build_prompt(context_text, query)
 
-Context:
-{context_text}
+    # 4. Run local model
+    llm = get_local_llm()
+    with span("generation", items=1):
+        output = llm(final_prompt)
 
-Question:
-{query}
+    answer_text = output[0]["generated_text"].strip()
 
-If the answer is not in the context, say:
-"I cannot find this information in the document."
+    _answer_cache.put(cache_key, (answer_text, list(retrieved_chunks)))
+    return answer_text, retrieved_chunks
 
-Answer:
-"""
 
-    # 4. Run local model
-    output = local_llm(final_prompt)
+def stream_answer(
+    index: Dict[str, Any],
+    query: str,
+    top_k: int = 5,
+    doc_ids: Optional[List[str]] = None,
+    max_new_tokens: int = GENERATION_MAX_NEW_TOKENS,
+    mode: str = "dense",
+    modalities: Optional[List[str]] = None,
+    page_range: Optional[Tuple[int, int]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming variant of answer_question. Yields events (dicts):
 
-    answer_text = output[0]["generated_text"].strip()
+    - {"type": "chunks", "chunks": [...]}      once, right after retrieval,
+                                               before generation starts
+    - {"type": "token", "text": "..."}         for each piece of decoded text
+    - {"type": "done", "answer": "...", "chunks": [...], "metrics": {...}}
 
-    return answer_text, retrieved_chunks
+    metrics: retrieval_s, time_to_first_token_s, total_s, n_tokens, cached, mode.
+    With the default max_new_tokens, answers are shared with answer_question's cache.
+
+    If generation fails, its exception is raised here; if no text arrives
+    for STREAM_TOKEN_TIMEOUT_S seconds, TimeoutError is raised.
+    """
+    start = time.perf_counter()
+    mode = resolve_search_mode(mode)
+    metrics: Dict[str, Any] = {"cached": False, "n_tokens": 0, "mode": mode}
+
+    cache_key = _answer_cache_key(index, query, top_k, doc_ids, mode, modalities, page_range, max_new_tokens)
+    cached = _answer_cache.get(cache_key)
+    if cached is not None:
+        answer_text, cached_chunks = cached
+        yield {"type": "chunks", "chunks": list(cached_chunks)}
+        yield {"type": "token", "text": answer_text}
+        elapsed = time.perf_counter() - start
+        metrics.update(
+            cached=True, retrieval_s=0.0, time_to_first_token_s=elapsed, total_s=elapsed, n_tokens=1
+        )
+        yield {"type": "done", "answer": answer_text, "chunks": list(cached_chunks), "metrics": metrics}
+        return
+
+    # 1. Retrieve top-k chunks
+    results = search_text_index(
+        index, query, top_k=top_k, doc_ids=doc_ids, mode=mode,
+        modalities=modalities, page_range=page_range,
+    )
+    retrieved_chunks = [chunk for score, chunk in results]
+    metrics["retrieval_s"] = time.perf_counter() - start
+    yield {"type": "chunks", "chunks": list(retrieved_chunks)}
+
+    if not retrieved_chunks:
+        yield {"type": "token", "text": NO_CONTEXT_ANSWER}
+        elapsed = time.perf_counter() - start
+        metrics.update(time_to_first_token_s=elapsed, total_s=elapsed, n_tokens=1)
+        yield {"type": "done", "answer": NO_CONTEXT_ANSWER, "chunks": [], "metrics": metrics}
+        return
+
+    # 2-3. Context + prompt, same as answer_question
+    final_prompt = build_prompt(format_context_for_prompt(retrieved_chunks), query)
+
+    # 4. Run local model on a thread, reading decoded text as it is produced
+    from transformers import TextIteratorStreamer
+
+    llm = get_local_llm()
+    tokenizer = llm.tokenizer
+    model = llm.model
+
+    inputs = tokenizer(final_prompt, return_tensors="pt").to(model.device)
+    streamer = TextIteratorStreamer(
+        tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=STREAM_TOKEN_TIMEOUT_S
+    )
+    errors: List[BaseException] = []
+
+    def _generate() -> None:
+        # Always end the stream, so the loop below can't wait forever on a failed generate
+        try:
+            model.generate(**inputs, streamer=streamer, max_new_tokens=max_new_tokens)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            streamer.end()
+
+    generation = threading.Thread(target=_generate, daemon=True)
+    generation.start()
+
+    pieces: List[str] = []
+    try:
+        for text in streamer:
+            if not text:
+                continue
+            if not pieces:
+                metrics["time_to_first_token_s"] = time.perf_counter() - start
+            pieces.append(text)
+            yield {"type": "token", "text": text}
+    except queue.Empty:
+        if errors:
+            raise errors[0]
+        raise TimeoutError(f"The model produced no text for {STREAM_TOKEN_TIMEOUT_S:g}s.")
+
+    generation.join()
+    if errors:
+        raise errors[0]
+
+    answer_text = "".join(pieces).strip()
+    metrics["n_tokens"] = len(pieces)
+    metrics["total_s"] = time.perf_counter() - start
+    tracer.record("generation", metrics["total_s"] - metrics["retrieval_s"], items=1)
+    metrics.setdefault("time_to_first_token_s", metrics["total_s"])
+
+    _answer_cache.put(cache_key, (answer_text, list(retrieved_chunks)))
+    yield {"type": "done", "answer": answer_text, "chunks": list(retrieved_chunks), "metrics": metrics}
+
+
+def answer_questions(
+    index: Dict[str, Any],
+    queries: List[str],
+    top_k: int = 5,
+    batch_size: int = 8,
+    doc_ids: Optional[List[str]] = None,
+    mode: str = "dense",
+    modalities: Optional[List[str]] = None,
+    page_range: Optional[Tuple[int, int]] = None,
+) -> List[Tuple[str, List[DocumentChunk]]]:
+    """
+    Bulk version of answer_question, for evaluation and batch jobs.
+    Returns one (answer, chunks) pair per query, in input order.
+
+    - all queries are embedded in one call and retrieved in one matrix product,
+    - prompts are sorted by length and sent to the model `batch_size`
+      at a time, so each padded batch holds prompts of similar length,
+    - cached answers are reused, duplicate queries are only answered once.
+    """
+    mode = resolve_search_mode(mode)
+    results: List[Optional[Tuple[str, List[DocumentChunk]]]] = [None] * len(queries)
+
+    # 1. Cached answers
+    todo: Dict[str, List[int]] = {}  # query -> positions still to answer
+    for pos, query in enumerate(queries):
+        cached = _answer_cache.get(_answer_cache_key(index, query, top_k, doc_ids, mode, modalities, page_range))
+        if cached is not None:
+            results[pos] = (cached[0], list(cached[1]))
+        else:
+            todo.setdefault(query, []).append(pos)
+
+    if todo:
+        unique_queries = list(todo.keys())
+
+        # 2. Retrieve for all remaining queries at once
+        all_hits = search_text_index_batch(
+            index, unique_queries, top_k=top_k, doc_ids=doc_ids, mode=mode,
+            modalities=modalities, page_range=page_range,
+        )
+
+        answers: Dict[str, Tuple[str, List[DocumentChunk]]] = {}
+        prompts: List[Tuple[str, str]] = []  # (query, prompt)
+        for query, hits in zip(unique_queries, all_hits):
+            retrieved_chunks = [chunk for score, chunk in hits]
+            if not retrieved_chunks:
+                answers[query] = (NO_CONTEXT_ANSWER, [])
+                continue
+            answers[query] = ("", retrieved_chunks)
+            prompts.append((query, build_prompt(format_context_for_prompt(retrieved_chunks), query)))
+
+        # 3. Generate in length-sorted batches
+        prompts.sort(key=lambda item: len(item[1]))
+        for start in range(0, len(prompts), batch_size):
+            batch = prompts[start:start + batch_size]
+            llm = get_local_llm()
+            with span("generation", items=len(batch)):
+                outputs = llm([prompt for _, prompt in batch], batch_size=len(batch))
+            for (query, _), output in zip(batch, outputs):
+                # The pipeline returns a list per input when given a list
+                if isinstance(output, list):
+                    output = output[0]
+                answers[query] = (output["generated_text"].strip(), answers[query][1])
+
+        # 4. Cache and put back in input order
+        for query, (answer_text, retrieved_chunks) in answers.items():
+            if retrieved_chunks:
+                _answer_cache.put(
+                    _answer_cache_key(index, query, top_k, doc_ids, mode, modalities, page_range),
+                    (answer_text, list(retrieved_chunks)),
+                )
+            for pos in todo[query]:
+                results[pos] = (answer_text, list(retrieved_chunks))
+
+    return results
+
+
+def get_qa_cache_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Hit-rate statistics of the QA caches:
+    - "query_embeddings": query string -> embedding (used by search)
+    - "answers": (index version, query, top_k, filters, mode) -> answer
+    """
+    return {
+        "query_embeddings": get_query_embedding_cache_stats(),
+        "answers": _answer_cache.stats(),
+    }
+
+
+def clear_answer_cache() -> None:
+    """
+    Drop all cached answers (e.g. after changing the prompt or the model).
+    """
+    _answer_cache.clear()
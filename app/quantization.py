@@ -0,0 +1,100 @@
+"""
+Compact storage of the embedding matrix, for indexes that don't fit in RAM
+as float32.
+
+Storage modes:
+- "float32": no compact copy (default)
+- "float16": half precision, 2 bytes per dimension
+- "int8":    per-dimension scaled int8, 1 byte per dimension
+             (x[:, d] ~= codes[:, d] * scale[d], scale[d] = max|x[:, d]| / 127)
+
+Search scores candidates with the compact matrix, over-fetches
+RESCORE_FACTOR * top_k of them, and rescores only those rows with the
+full-precision float32 embeddings (memory-mapped for loaded indexes,
+so only the over-fetched rows are read from disk).
+
+Use app.index.quantization_report to see memory saved and recall@k lost.
+"""
+
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+STORAGE_MODES = ("float32", "float16", "int8")
+
+# Candidates rescored in float32 per query = RESCORE_FACTOR * top_k
+RESCORE_FACTOR = 4
+
+# Rows decoded per block when scoring the whole compact matrix,
+# bounds the temporary float32 copy
+SCORE_BLOCK_SIZE = 65536
+
+
+def quantize(embeddings: np.ndarray, mode: str, scale: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    Build the compact copy of `embeddings` (N, D):
+
+    {
+      "mode": "float16" or "int8",
+      "codes": np.ndarray (N, D) of float16 / int8,
+      "scale": np.ndarray (D,) float32 (int8 only)
+    }
+
+    For int8, pass an existing `scale` to encode new rows consistently with
+    old ones (values outside the old range are clipped).
+    """
+    if mode not in STORAGE_MODES or mode == "float32":
+        raise ValueError(f"Unknown quantized storage '{mode}', expected 'float16' or 'int8'.")
+
+    if mode == "float16":
+        codes = np.empty(embeddings.shape, dtype=np.float16)
+        for start in range(0, embeddings.shape[0], SCORE_BLOCK_SIZE):
+            codes[start:start + SCORE_BLOCK_SIZE] = embeddings[start:start + SCORE_BLOCK_SIZE]
+        return {"mode": mode, "codes": codes}
+
+    if scale is None:
+        max_abs = np.zeros(embeddings.shape[1], dtype="float32")
+        for start in range(0, embeddings.shape[0], SCORE_BLOCK_SIZE):
+            block = np.abs(np.asarray(embeddings[start:start + SCORE_BLOCK_SIZE], dtype="float32"))
+            if block.size:
+                np.maximum(max_abs, block.max(axis=0), out=max_abs)
+        # Dimensions that are always 0 get scale 1 (codes stay 0 anyway)
+        scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype("float32")
+
+    codes = np.empty(embeddings.shape, dtype=np.int8)
+    for start in range(0, embeddings.shape[0], SCORE_BLOCK_SIZE):
+        block = np.asarray(embeddings[start:start + SCORE_BLOCK_SIZE], dtype="float32")
+        codes[start:start + block.shape[0]] = np.clip(np.rint(block / scale), -127, 127)
+    return {"mode": mode, "codes": codes, "scale": np.asarray(scale, dtype="float32")}
+
+
+def approximate_scores(quantized: Dict[str, Any], queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Approximate dot products between `queries` (Q, D) and the compact rows
+    (all rows, or only `rows`). Returns a float32 matrix (Q, n_rows).
+
+    For int8 the per-dimension scale is folded into the queries,
+    so the codes are only cast, never rescaled.
+    """
+    codes = quantized["codes"]
+    if quantized["mode"] == "int8":
+        queries = queries * quantized["scale"]
+    queries = np.asarray(queries, dtype="float32")
+
+    if rows is not None:
+        return queries @ np.asarray(codes[rows], dtype="float32").T
+
+    scores = np.empty((queries.shape[0], codes.shape[0]), dtype="float32")
+    for start in range(0, codes.shape[0], SCORE_BLOCK_SIZE):
+        block = np.asarray(codes[start:start + SCORE_BLOCK_SIZE], dtype="float32")
+        scores[:, start:start + block.shape[0]] = queries @ block.T
+    return scores
+
+
+def quantized_nbytes(quantized: Optional[Dict[str, Any]]) -> int:
+    """
+    Memory held by the compact copy (codes + scale).
+    """
+    if not quantized:
+        return 0
+    return int(quantized["codes"].nbytes) + int(quantized.get("scale", np.zeros(0)).nbytes)
@@ -0,0 +1,440 @@
+"""
+Async HTTP query service (stdlib asyncio only, no web framework).
+
+Endpoints (JSON in / JSON out):
+- POST /search   {"query": "...", "top_k": 5, ...options}  -> {"results": [...]}
+- POST /answer   {"query": "...", "top_k": 5, ...options}  -> {"answer": "...", "chunks": [...]}
+- GET  /health                                            -> queue depths, batch stats
+
+Options (all optional): "doc_ids": [...], "modalities": ["table", ...],
+"page_range": [first, last], "mode": "dense" | "lexical" | "hybrid" | "auto".
+
+Concurrent requests are collected for a short window (max_wait_ms) into one
+batch, so the embedder runs once per batch (search_text_index_batch) and the
+LLM gets one padded batch (answer_questions).
+- Queues are bounded: when full the server answers 429 (back-pressure).
+- Every request has a deadline (timeout_ms, default per endpoint): requests
+  that expire while queued are dropped before reaching the model, and the
+  client gets 504.
+
+Run:
+python -m app.server --index qatar_report --port 8000
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import time
+
+from app.chunk_store import MODALITIES
+from app.index import load_text_index, search_text_index_batch, SEARCH_MODES
+from app.qa_pipeline import answer_questions, warm_up_models
+
+MAX_BODY_BYTES = 1 << 20
+
+
+class Overloaded(Exception):
+    """Raised when a batcher queue is full (HTTP 429)."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes before it is served (HTTP 504)."""
+
+
+class MicroBatcher:
+    """
+    Collects items submitted concurrently into batches of at most
+    `max_batch_size`, waiting at most `max_wait_ms` after the first item,
+    and runs `process_batch(items) -> results` on a worker thread.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 10.0,
+        max_queue: int = 256,
+        name: str = "batcher",
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.name = name
+        self._queue: "asyncio.Queue[Tuple[Any, asyncio.Future, float]]" = asyncio.Queue(maxsize=max_queue)
+        # One thread per batcher: model calls of the same kind never overlap
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._task: Optional[asyncio.Task] = None
+
+        self.n_batches = 0
+        self.n_items = 0
+        self.n_rejected = 0
+        self.n_expired = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, item: Any, deadline: float) -> Any:
+        """
+        Queue one item and wait for its result.
+        `deadline` is an absolute time.monotonic() value.
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future, deadline))
+        except asyncio.QueueFull:
+            self.n_rejected += 1
+            raise Overloaded(f"{self.name} queue is full")
+
+        try:
+            return await asyncio.wait_for(future, timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"{self.name} request timed out")
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future, float]]:
+        batch = [await self._queue.get()]
+        window_end = time.monotonic() + self.max_wait_s
+
+        while len(batch) < self.max_batch_size:
+            remaining = window_end - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+
+            # Drop requests that expired (or were abandoned) while queued
+            now = time.monotonic()
+            live = []
+            for item, future, deadline in batch:
+                if future.done():
+                    continue
+                if deadline <= now:
+                    self.n_expired += 1
+                    future.set_exception(DeadlineExceeded(f"{self.name} request expired in queue"))
+                    continue
+                live.append((item, future))
+
+            if not live:
+                continue
+
+            # process_batch may return an exception instance for single items
+            # (e.g. one failed option group); only those futures fail
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.process_batch, [item for item, _ in live]
+                )
+            except Exception as e:
+                for _, future in live:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.n_batches += 1
+            self.n_items += len(live)
+            for (_, future), result in zip(live, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches": self.n_batches,
+            "items": self.n_items,
+            "avg_batch_size": self.n_items / self.n_batches if self.n_batches else 0.0,
+            "rejected": self.n_rejected,
+            "expired": self.n_expired,
+        }
+
+
+# Request fields that select how a query is run; requests are batched per distinct value
+_OPTION_FIELDS = ("top_k", "doc_ids", "mode", "modalities", "page_range")
+
+
+def _group_key(request: Dict[str, Any]) -> Tuple:
+    key = []
+    for field in _OPTION_FIELDS:
+        value = request.get(field)
+        if field in ("doc_ids", "modalities") and value is not None:
+            value = tuple(sorted(set(value)))
+        elif field == "page_range" and value is not None:
+            value = tuple(value)
+        key.append(value)
+    return tuple(key)
+
+
+def _run_grouped(
+    requests: List[Dict[str, Any]],
+    run_group: Callable[..., List[Any]],
+) -> List[Any]:
+    # One batched call per distinct set of options, results back in request order.
+    # run_group(queries, **options) gets the options of _OPTION_FIELDS as keywords.
+    # A group that fails gets its exception as the result of each of its requests.
+    results: List[Any] = [None] * len(requests)
+    groups: Dict[Tuple, List[int]] = {}
+    for pos, request in enumerate(requests):
+        groups.setdefault(_group_key(request), []).append(pos)
+
+    for positions in groups.values():
+        queries = [requests[pos]["query"] for pos in positions]
+        first = requests[positions[0]]
+        options = {field: first.get(field) for field in _OPTION_FIELDS}
+        try:
+            group_results = run_group(queries, **options)
+        except Exception as e:
+            group_results = [e] * len(positions)
+        for pos, result in zip(positions, group_results):
+            results[pos] = result
+    return results
+
+
+def _parse_string_list(value: Any, field: str) -> Optional[Tuple[str, ...]]:
+    # None, or a JSON list of strings -> sorted tuple without duplicates
+    if value is None:
+        return None
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"'{field}' must be a list of strings.")
+    return tuple(sorted(set(value)))
+
+
+def _chunk_to_json(chunk) -> Dict[str, Any]:
+    return chunk.model_dump()
+
+
+class QueryService:
+    """
+    Holds the index and one micro-batcher per endpoint.
+    """
+
+    def __init__(
+        self,
+        index: Dict[str, Any],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 10.0,
+        max_queue: int = 256,
+        generation_batch_size: int = 8,
+        search_timeout_ms: float = 2_000,
+        answer_timeout_ms: float = 60_000,
+    ):
+        self.index = index
+        self.generation_batch_size = generation_batch_size
+        self.default_timeouts_s = {
+            "search": search_timeout_ms / 1000.0,
+            "answer": answer_timeout_ms / 1000.0,
+        }
+        self.batchers = {
+            "search": MicroBatcher(self._search_batch, max_batch_size, max_wait_ms, max_queue, "search"),
+            "answer": MicroBatcher(self._answer_batch, max_batch_size, max_wait_ms, max_queue, "answer"),
+        }
+
+    def start(self) -> None:
+        for batcher in self.batchers.values():
+            batcher.start()
+
+    async def stop(self) -> None:
+        for batcher in self.batchers.values():
+            await batcher.stop()
+
+    def _search_batch(self, requests: List[Dict[str, Any]]) -> List[Any]:
+        def run_group(queries, **options):
+            hits = search_text_index_batch(self.index, queries, **options)
+            return [
+                {"results": [{"score": score, "chunk": _chunk_to_json(chunk)} for score, chunk in query_hits]}
+                for query_hits in hits
+            ]
+
+        return _run_grouped(requests, run_group)
+
+    def _answer_batch(self, requests: List[Dict[str, Any]]) -> List[Any]:
+        def run_group(queries, **options):
+            answers = answer_questions(
+                self.index, queries, batch_size=self.generation_batch_size, **options
+            )
+            return [
+                {"answer": answer, "chunks": [_chunk_to_json(c) for c in chunks]}
+                for answer, chunks in answers
+            ]
+
+        return _run_grouped(requests, run_group)
+
+    async def handle(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """
+        Route one request. Returns (HTTP status, JSON payload).
+        """
+        if method == "GET" and path == "/health":
+            return 200, {
+                "status": "ok",
+                "chunks": len(self.index["chunks"]),
+                "batchers": {name: b.stats() for name, b in self.batchers.items()},
+            }
+
+        endpoint = path.strip("/")
+        if method != "POST" or endpoint not in self.batchers:
+            return 404, {"error": f"No route for {method} {path}"}
+
+        try:
+            payload = json.loads(body or b"{}")
+            query = str(payload["query"]).strip()
+            top_k = int(payload.get("top_k", 5))
+            doc_ids = _parse_string_list(payload.get("doc_ids"), "doc_ids")
+            mode = str(payload.get("mode", "dense"))
+            modalities = _parse_string_list(payload.get("modalities"), "modalities")
+            page_range = payload.get("page_range")
+            if page_range is not None:
+                first, last = page_range
+                page_range = (int(first), int(last))
+            timeout_s = float(payload.get("timeout_ms", 0)) / 1000.0 or self.default_timeouts_s[endpoint]
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": f"Bad request: {e}"}
+
+        if not query or top_k <= 0:
+            return 400, {"error": "Bad request: 'query' must be non-empty and 'top_k' positive."}
+        if mode not in SEARCH_MODES:
+            return 400, {"error": f"Bad request: 'mode' must be one of {list(SEARCH_MODES)}."}
+        if modalities is not None and not set(modalities) <= set(MODALITIES):
+            return 400, {"error": f"Bad request: 'modalities' must be a list of {list(MODALITIES)}."}
+
+        request = {
+            "query": query,
+            "top_k": top_k,
+            "doc_ids": doc_ids,
+            "mode": mode,
+            "modalities": modalities,
+            "page_range": page_range,
+        }
+        try:
+            result = await self.batchers[endpoint].submit(request, time.monotonic() + timeout_s)
+        except Overloaded as e:
+            return 429, {"error": str(e)}
+        except DeadlineExceeded as e:
+            return 504, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+        return 200, result
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+            429: "Too Many Requests", 500: "Internal Server Error", 504: "Gateway Timeout"}
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    if not request_line:
+        raise ValueError("empty request")
+    method, path, _ = request_line.split(" ", 2)
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1")
+        if line in ("\r\n", "\n", ""):
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", "0"))
+    if length > MAX_BODY_BYTES:
+        raise OverflowError("body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path.split("?", 1)[0], body
+
+
+async def _write_response(writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any]) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n"
+    )
+    if status == 429:
+        head += "Retry-After: 1\r\n"
+    writer.write(head.encode("latin-1") + b"\r\n" + body)
+    await writer.drain()
+
+
+async def serve(service: QueryService, host: str = "127.0.0.1", port: int = 8000) -> None:
+    """
+    Start the batchers and serve HTTP until cancelled.
+    """
+    async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                method, path, body = await _read_request(reader)
+            except OverflowError:
+                await _write_response(writer, 413, {"error": "Request body too large."})
+                return
+            except (ValueError, asyncio.IncompleteReadError):
+                await _write_response(writer, 400, {"error": "Malformed HTTP request."})
+                return
+            status, payload = await service.handle(method, path, body)
+            await _write_response(writer, status, payload)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    service.start()
+    server = await asyncio.start_server(_handle_connection, host, port)
+    print(f"✅ Query service listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async HTTP query service with micro-batching.")
+    parser.add_argument("--index", default="qatar_report", help="Name of a saved index in data/indexes/")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--max-queue", type=int, default=256)
+    parser.add_argument("--generation-batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    index = load_text_index(args.index)
+    print(f"Loaded index '{args.index}' ({len(index['chunks'])} chunks).")
+
+    # Load the models before accepting traffic
+    warm_up_models(background=False)
+
+    service = QueryService(
+        index,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_queue=args.max_queue,
+        generation_batch_size=args.generation_batch_size,
+    )
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        print("Goodbye!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Lightweight tracing: where does the time go in ingestion and QA?
+
+Usage:
+    from app.tracing import span
+
+    with span("embed", items=len(texts)):
+        ...
+
+Each span records wall time, an item count (pages, images, chunks,
+queries, ...) and the process peak RSS when it ends. Spans are aggregated
+per name (count, total / max seconds, items) and the most recent ones are
+kept for inspection.
+
+Span names used in this repo:
+- ingestion: pdf_open, text_extract (per page), page_triage (per page,
+  with attr kind), ocr_image (per image), table_extract (per page, or per
+  batch of pages in a worker), tabula (fallback only), chunking
+- indexing / QA: embed (per model call), query_embedding, search, generation
+
+Export with get_trace_stats() (JSON-friendly dict), export_prometheus()
+(Prometheus text format) or format_trace_summary() (table for the console).
+Spans measured in another process (e.g. OCR workers) are added with record().
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Most recent individual spans kept in memory (for the debug panel)
+MAX_RECENT_SPANS = 500
+
+
+def get_peak_rss_bytes() -> Optional[int]:
+    """
+    Peak resident set size of this process so far, or None if unknown.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+
+
+class Span:
+    """
+    One timed section. `items` can be set while the span is open.
+    """
+
+    def __init__(self, name: str, items: int = 0, attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.items = items
+        self.attrs = attrs or {}
+        self.start = time.time()
+        self.seconds = 0.0
+        self.peak_rss_bytes: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "start": self.start,
+            "seconds": self.seconds,
+            "items": self.items,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            **self.attrs,
+        }
+
+
+class Tracer:
+    """
+    Thread-safe collector of spans. Use the module-level `tracer`.
+    """
+
+    def __init__(self, max_recent: int = MAX_RECENT_SPANS):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._recent: Deque[Span] = deque(maxlen=max_recent)
+
+    @contextmanager
+    def span(self, name: str, items: int = 0, **attrs: Any) -> Iterator[Span]:
+        current = Span(name, items, attrs)
+        started = time.perf_counter()
+        try:
+            yield current
+        finally:
+            current.seconds = time.perf_counter() - started
+            if self.enabled:
+                current.peak_rss_bytes = get_peak_rss_bytes()
+                self._add(current)
+
+    def record(self, name: str, seconds: float, items: int = 1, **attrs: Any) -> None:
+        """
+        Add a span that was timed elsewhere (e.g. in a worker process).
+        """
+        if not self.enabled:
+            return
+        current = Span(name, items, attrs)
+        current.start = time.time() - seconds
+        current.seconds = seconds
+        current.peak_rss_bytes = get_peak_rss_bytes()
+        self._add(current)
+
+    def _add(self, current: Span) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(
+                current.name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "items": 0}
+            )
+            stats["count"] += 1
+            stats["total_seconds"] += current.seconds
+            stats["max_seconds"] = max(stats["max_seconds"], current.seconds)
+            stats["items"] += current.items
+            self._recent.append(current)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        {"spans": {name: {count, total_seconds, max_seconds, items}},
+         "peak_rss_bytes": ..., "recent": [last spans, oldest first]}
+        """
+        with self._lock:
+            return {
+                "spans": {name: dict(stats) for name, stats in self._stats.items()},
+                "peak_rss_bytes": get_peak_rss_bytes(),
+                "recent": [s.to_dict() for s in self._recent],
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._recent.clear()
+
+
+tracer = Tracer()
+
+
+def span(name: str, items: int = 0, **attrs: Any):
+    """
+    Context manager timing a section with the shared tracer.
+    """
+    return tracer.span(name, items=items, **attrs)
+
+
+def get_trace_stats() -> Dict[str, Any]:
+    return tracer.stats()
+
+
+def reset_trace() -> None:
+    tracer.reset()
+
+
+def export_prometheus(prefix: str = "rag") -> str:
+    """
+    Span stats in the Prometheus text exposition format.
+    """
+    stats = tracer.stats()
+    metrics = [
+        ("span_count_total", "counter", "Number of finished spans", "count"),
+        ("span_seconds_total", "counter", "Total wall time spent in spans", "total_seconds"),
+        ("span_seconds_max", "gauge", "Longest single span", "max_seconds"),
+        ("span_items_total", "counter", "Items processed in spans", "items"),
+    ]
+    lines: List[str] = []
+    for metric, kind, help_text, key in metrics:
+        lines.append(f"# HELP {prefix}_{metric} {help_text}")
+        lines.append(f"# TYPE {prefix}_{metric} {kind}")
+        for name, span_stats in sorted(stats["spans"].items()):
+            lines.append(f'{prefix}_{metric}{{span="{name}"}} {span_stats[key]:g}')
+    if stats["peak_rss_bytes"] is not None:
+        lines.append(f"# HELP {prefix}_peak_rss_bytes Peak resident set size of the process")
+        lines.append(f"# TYPE {prefix}_peak_rss_bytes gauge")
+        lines.append(f"{prefix}_peak_rss_bytes {stats['peak_rss_bytes']}")
+    return "\n".join(lines) + "\n"
+
+
+def format_trace_summary() -> str:
+    """
+    Per-span table (slowest total first) for console output.
+    """
+    stats = tracer.stats()
+    lines = [f"{'span':<18}{'count':>8}{'total s':>10}{'max s':>9}{'items':>9}"]
+    for name, s in sorted(stats["spans"].items(), key=lambda item: -item[1]["total_seconds"]):
+        lines.append(
+            f"{name:<18}{int(s['count']):>8}{s['total_seconds']:>10.3f}"
+            f"{s['max_seconds']:>9.3f}{int(s['items']):>9}"
+        )
+    if stats["peak_rss_bytes"] is not None:
+        lines.append(f"peak RSS: {stats['peak_rss_bytes'] / 2**20:.0f} MB")
+    return "\n".join(lines)
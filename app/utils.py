@@ -0,0 +1,169 @@
+"""
+Small helpers shared by several modules.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, TypeVar
+import hashlib
+import queue
+import threading
+
+T = TypeVar("T")
+
+
+def make_chunk_id(
+    doc_id: str,
+    modality: str,
+    page: int,
+    content: str,
+    occurrence: int = 0,
+) -> str:
+    """
+    Deterministic chunk id derived from where the chunk comes from and what it says.
+    Re-ingesting the same document gives the same ids, so unchanged chunks
+    can be matched across runs (and don't need to be re-embedded).
+
+    `occurrence` tells apart identical chunks on the same page (0 for the first one).
+    """
+    key = f"{doc_id}\x00{modality}\x00{page}\x00{occurrence}\x00{content}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+class ChunkIdAllocator:
+    """
+    Hands out make_chunk_id ids, bumping `occurrence` when the same
+    (doc_id, modality, page, content) shows up more than once.
+    """
+
+    def __init__(self):
+        self._seen = {}
+
+    def __call__(self, doc_id: str, modality: str, page: int, content: str) -> str:
+        key = (doc_id, modality, page, content)
+        occurrence = self._seen.get(key, 0)
+        self._seen[key] = occurrence + 1
+        return make_chunk_id(doc_id, modality, page, content, occurrence)
+
+
+def iter_batches(items: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    """
+    Group any iterable into lists of at most `batch_size` items.
+    """
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive.")
+
+    batch: List[T] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_END = object()
+
+
+class _ProducerError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def prefetch(items: Iterable[T], max_pending: int = 2) -> Iterator[T]:
+    """
+    Pull `items` on a background thread, keeping at most `max_pending`
+    items ready ahead of the consumer. Lets a slow producer (PDF parsing, OCR)
+    overlap with a slow consumer (embedding) without unbounded buffering.
+    Exceptions in the producer are re-raised in the consumer.
+    """
+    buffer: "queue.Queue" = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+
+    def _put(item) -> bool:
+        # Give up if the consumer went away, instead of blocking forever
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in items:
+                if not _put(item):
+                    return
+        except BaseException as e:
+            _put(_ProducerError(e))
+        finally:
+            _put(_END)
+
+    thread = threading.Thread(target=_produce, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                break
+            if isinstance(item, _ProducerError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+
+class LRUCache:
+    """
+    Small thread-safe LRU cache with hit/miss counters.
+    Holds at most `maxsize` entries; the least recently used one is dropped first.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the cached value, or None on a miss.
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
@@ -0,0 +1,3 @@
+"""
+Offline benchmarks (no PDF, no model download). See benchmarks/run.py.
+"""
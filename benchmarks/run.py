@@ -0,0 +1,288 @@
+"""
+Offline benchmark suite: chunking, index build and search at scale.
+
+Runs on a synthetic corpus with a deterministic stub embedder and
+tokenizer (benchmarks/synthetic.py), so it needs no PDF, no model
+download and no network. Results are saved to data/benchmarks/ as JSON,
+one file per run, tagged with the git commit, so runs can be compared.
+
+Usage:
+    python -m benchmarks.run                          # 10k, 100k and 1M chunks
+    python -m benchmarks.run --sizes 10000 100000
+    python -m benchmarks.run --backend ivf --storage int8
+    python -m benchmarks.run --compare                # vs the previous run
+    python -m benchmarks.run --compare data/benchmarks/<file>.json
+
+Measured:
+- chunking: split_text_into_chunks and split_pages_into_token_chunks throughput
+- build: build_text_index_from_stream wall time, chunks/s and peak RSS
+  (dense only: BM25 is built on the first lexical / hybrid search)
+- search: search_text_index p50 / p99 latency over distinct queries,
+  plus search_text_index_batch throughput
+
+Each corpus size runs in its own subprocess, so peak RSS is per size.
+"""
+
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from app.config import DATA_DIR
+
+BENCHMARKS_DIR = DATA_DIR / "benchmarks"
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+N_QUERIES = 200
+SEARCH_BATCH_SIZE = 64
+CHUNKING_PAGES = 500
+STUB_MODEL_NAME = "benchmark-hashing-stub"
+
+# Relative change above which --compare flags a metric
+REGRESSION_THRESHOLD = 0.10
+
+# (section, metric, True if higher is better)
+COMPARED_METRICS = [
+    ("build", "seconds", False),
+    ("build", "peak_rss_mb", False),
+    ("search", "p50_ms", False),
+    ("search", "p99_ms", False),
+    ("search", "batch_qps", True),
+]
+
+
+def _use_stub_embedder() -> None:
+    from app.embeddings import set_text_embedding_model
+    from benchmarks.synthetic import HashingEmbedder
+
+    set_text_embedding_model(HashingEmbedder(), STUB_MODEL_NAME, use_disk_cache=False)
+
+
+def bench_chunking(n_pages: int = CHUNKING_PAGES) -> Dict[str, Any]:
+    """
+    Chunking throughput on synthetic page texts, both chunkers.
+    """
+    from app.chunking import split_text_into_chunks, split_pages_into_token_chunks
+    from benchmarks.synthetic import synthetic_page_texts, RegexTokenizer
+
+    pages = synthetic_page_texts(n_pages)
+    megabytes = sum(len(p) for p in pages) / 1e6
+
+    start = time.perf_counter()
+    n_word_chunks = sum(len(split_text_into_chunks(p)) for p in pages)
+    word_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    n_token_chunks = sum(len(c) for c in split_pages_into_token_chunks(pages, tokenizer=RegexTokenizer()))
+    token_seconds = time.perf_counter() - start
+
+    return {
+        "pages": n_pages,
+        "megabytes": round(megabytes, 3),
+        "split_text_into_chunks": {
+            "seconds": word_seconds,
+            "chunks": n_word_chunks,
+            "mb_per_s": megabytes / word_seconds,
+        },
+        "split_pages_into_token_chunks": {
+            "seconds": token_seconds,
+            "chunks": n_token_chunks,
+            "mb_per_s": megabytes / token_seconds,
+        },
+    }
+
+
+def bench_size(n_chunks: int, backend: str, storage: str, n_queries: int = N_QUERIES) -> Dict[str, Any]:
+    """
+    Build an index of `n_chunks` synthetic chunks, then time searches on it.
+    Meant to run in a fresh process (see _run_size_subprocess).
+    """
+    from app.index import build_text_index_from_stream, search_text_index, search_text_index_batch
+    from app.tracing import get_peak_rss_bytes
+    from benchmarks.synthetic import iter_synthetic_chunks, synthetic_queries
+
+    _use_stub_embedder()
+    rss_before = get_peak_rss_bytes()
+
+    # STEP 1: build (the stream builder, as ingestion uses; it also avoids
+    # holding N DocumentChunk objects at once)
+    start = time.perf_counter()
+    index = build_text_index_from_stream(iter_synthetic_chunks(n_chunks), backend=backend, storage=storage)
+    build_seconds = time.perf_counter() - start
+    peak_rss = get_peak_rss_bytes()
+
+    # STEP 2: single-query latency (distinct queries: no query cache hits)
+    queries = synthetic_queries(n_queries)
+    search_text_index(index, "warm up", top_k=5)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search_text_index(index, query, top_k=5)
+        latencies.append(time.perf_counter() - start)
+    latencies_ms = np.array(latencies) * 1000.0
+
+    # STEP 3: batched throughput
+    batch_queries = synthetic_queries(n_queries, seed=2)
+    start = time.perf_counter()
+    for i in range(0, len(batch_queries), SEARCH_BATCH_SIZE):
+        search_text_index_batch(index, batch_queries[i:i + SEARCH_BATCH_SIZE], top_k=5)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "n_chunks": n_chunks,
+        "backend": backend,
+        "storage": storage,
+        "build": {
+            "seconds": build_seconds,
+            "chunks_per_s": n_chunks / build_seconds,
+            "peak_rss_mb": peak_rss / 2**20 if peak_rss is not None else None,
+            "rss_before_mb": rss_before / 2**20 if rss_before is not None else None,
+            "embeddings_mb": index["embeddings"].nbytes / 2**20,
+        },
+        "search": {
+            "queries": n_queries,
+            "p50_ms": float(np.percentile(latencies_ms, 50)),
+            "p99_ms": float(np.percentile(latencies_ms, 99)),
+            "mean_ms": float(latencies_ms.mean()),
+            "batch_qps": n_queries / batch_seconds,
+        },
+    }
+
+
+def _run_size_subprocess(n_chunks: int, backend: str, storage: str, n_queries: int) -> Optional[Dict[str, Any]]:
+    cmd = [
+        sys.executable, "-m", "benchmarks.run", "--worker", str(n_chunks),
+        "--backend", backend, "--storage", storage, "--queries", str(n_queries),
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(f"[WARN] Benchmark at {n_chunks} chunks failed:\n{proc.stderr.strip()[-2000:]}")
+        return None
+    # The result is the last line printed by the worker
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=DATA_DIR.parent
+        )
+        commit = out.stdout.strip() or "unknown"
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, cwd=DATA_DIR.parent
+        )
+        return commit + ("-dirty" if dirty.stdout.strip() else "")
+    except OSError:
+        return "unknown"
+
+
+def save_results(results: Dict[str, Any]) -> Path:
+    BENCHMARKS_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = BENCHMARKS_DIR / f"{stamp}_{results['commit']}.json"
+    path.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return path
+
+
+def _previous_results(exclude: Path) -> Optional[Path]:
+    files = sorted(p for p in BENCHMARKS_DIR.glob("*.json") if p != exclude)
+    return files[-1] if files else None
+
+
+def compare_results(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """
+    Side by side table of the metrics in COMPARED_METRICS for the sizes
+    both runs have. Changes worse than REGRESSION_THRESHOLD are flagged.
+    """
+    lines = [f"{'size':>9}  {'metric':<20}{'old':>11}{'new':>11}{'change':>9}"]
+    old_sizes = {str(r["n_chunks"]): r for r in old["sizes"]}
+    for result in new["sizes"]:
+        previous = old_sizes.get(str(result["n_chunks"]))
+        if previous is None:
+            continue
+        for section, metric, higher_is_better in COMPARED_METRICS:
+            before, after = previous[section].get(metric), result[section].get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSION" if worse > REGRESSION_THRESHOLD else ""
+            lines.append(
+                f"{result['n_chunks']:>9}  {section + '.' + metric:<20}{before:>11.2f}{after:>11.2f}{change:>+9.1%}{flag}"
+            )
+    return lines
+
+
+def format_results(results: Dict[str, Any]) -> List[str]:
+    chunking = results["chunking"]
+    lines = [
+        f"chunking ({chunking['pages']} pages, {chunking['megabytes']:.1f} MB):",
+        f"  split_text_into_chunks         {chunking['split_text_into_chunks']['mb_per_s']:8.2f} MB/s",
+        f"  split_pages_into_token_chunks  {chunking['split_pages_into_token_chunks']['mb_per_s']:8.2f} MB/s",
+        f"{'size':>9}  {'build s':>9}{'chunks/s':>10}{'RSS MB':>9}{'p50 ms':>9}{'p99 ms':>9}{'batch q/s':>11}",
+    ]
+    for r in results["sizes"]:
+        build, search = r["build"], r["search"]
+        rss = f"{build['peak_rss_mb']:.0f}" if build["peak_rss_mb"] is not None else "-"
+        lines.append(
+            f"{r['n_chunks']:>9}  {build['seconds']:>9.2f}{build['chunks_per_s']:>10.0f}{rss:>9}"
+            f"{search['p50_ms']:>9.2f}{search['p99_ms']:>9.2f}{search['batch_qps']:>11.0f}"
+        )
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Offline chunking / index / search benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--backend", default="exact", choices=["exact", "ivf"])
+    parser.add_argument("--storage", default="float32", choices=["float32", "float16", "int8"])
+    parser.add_argument("--queries", type=int, default=N_QUERIES)
+    parser.add_argument("--compare", nargs="?", const="previous", default=None,
+                        help="compare with a results file (default: the previous run)")
+    parser.add_argument("--worker", type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker is not None:
+        # Subprocess mode: one size, result as JSON on the last line
+        print(json.dumps(bench_size(args.worker, args.backend, args.storage, args.queries)))
+        return
+
+    print("⏱ Chunking ...")
+    results: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "chunking": bench_chunking(),
+        "sizes": [],
+    }
+    for n_chunks in args.sizes:
+        print(f"⏱ Index build + search at {n_chunks} chunks ...")
+        result = _run_size_subprocess(n_chunks, args.backend, args.storage, args.queries)
+        if result is not None:
+            results["sizes"].append(result)
+
+    path = save_results(results)
+    print("\n".join(format_results(results)))
+    print(f"💾 Results saved to {path}")
+
+    if args.compare:
+        baseline = _previous_results(path) if args.compare == "previous" else Path(args.compare)
+        if baseline is None:
+            print("[WARN] No previous benchmark results to compare with.")
+            return
+        print(f"\n📊 Compared with {baseline.name}:")
+        old = json.loads(baseline.read_text(encoding="utf-8"))
+        print("\n".join(compare_results(old, results)))
+
+
+if __name__ == "__main__":
+    main()
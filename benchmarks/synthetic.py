@@ -0,0 +1,148 @@
+"""
+Synthetic inputs for the offline benchmarks:
+- iter_synthetic_chunks / synthetic_page_texts: a fake corpus with topics,
+  numbers and acronyms, generated from a seed (same seed -> same corpus)
+- HashingEmbedder: deterministic stand-in for the sentence-transformers model
+- RegexTokenizer: stand-in for the fast tokenizer (same call API, offsets included)
+
+Nothing here touches the network, so benchmarks run anywhere.
+"""
+
+from typing import Iterator, List
+import re
+import zlib
+
+import numpy as np
+
+from app.models import DocumentChunk
+
+N_TOPICS = 200
+VOCAB_SIZE = 20_000
+WORDS_PER_CHUNK = 80
+CHUNKS_PER_DOC = 500
+# Words of a chunk drawn from its topic's own slice of the vocabulary
+TOPIC_WORD_SHARE = 0.6
+TOPIC_VOCAB_SIZE = 200
+
+
+def _make_vocab(rng: np.random.Generator) -> np.ndarray:
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    lengths = rng.integers(3, 10, size=VOCAB_SIZE)
+    words = ["".join(rng.choice(letters, size=n)) for n in lengths]
+    # Some acronyms, years and figures, like in real reports
+    for i in range(0, VOCAB_SIZE, 50):
+        words[i] = words[i][:3].upper()
+    for i in range(25, VOCAB_SIZE, 100):
+        words[i] = str(1990 + i % 40)
+    return np.array(words)
+
+
+def iter_synthetic_chunks(n_chunks: int, seed: int = 0) -> Iterator[DocumentChunk]:
+    """
+    Yields `n_chunks` text chunks. Every chunk starts with its topic word
+    ("topic17"), which the HashingEmbedder uses to cluster the vectors.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = _make_vocab(rng)
+    n_topic_words = int(WORDS_PER_CHUNK * TOPIC_WORD_SHARE)
+
+    for start in range(0, n_chunks, 10_000):
+        n = min(10_000, n_chunks - start)
+        topics = rng.integers(0, N_TOPICS, size=n)
+        topic_words = (topics[:, None] * TOPIC_VOCAB_SIZE
+                       + rng.integers(0, TOPIC_VOCAB_SIZE, size=(n, n_topic_words))) % VOCAB_SIZE
+        other_words = rng.integers(0, VOCAB_SIZE, size=(n, WORDS_PER_CHUNK - n_topic_words))
+        word_ids = np.concatenate([topic_words, other_words], axis=1)
+
+        for offset in range(n):
+            row = start + offset
+            content = f"topic{topics[offset]} " + " ".join(vocab[word_ids[offset]]) + "."
+            yield DocumentChunk(
+                id=f"synthetic-{row}",
+                doc_id=f"doc{row // CHUNKS_PER_DOC}",
+                modality="table" if row % 10 == 0 else "text",
+                page=1 + (row % CHUNKS_PER_DOC) // 5,
+                content=content,
+                extra=None,
+            )
+
+
+def synthetic_queries(n_queries: int, seed: int = 1) -> List[str]:
+    """
+    Distinct query strings (so the query embedding cache never hits).
+    """
+    rng = np.random.default_rng(seed)
+    vocab = _make_vocab(np.random.default_rng(0))
+    return [
+        f"topic{rng.integers(0, N_TOPICS)} " + " ".join(vocab[rng.integers(0, VOCAB_SIZE, size=6)]) + f" q{i}"
+        for i in range(n_queries)
+    ]
+
+
+def synthetic_page_texts(n_pages: int, seed: int = 2, sentences_per_page: int = 30) -> List[str]:
+    """
+    Page texts made of sentences and paragraphs, for the chunking benchmark.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = _make_vocab(np.random.default_rng(0))
+    pages = []
+    for _ in range(n_pages):
+        sentences = []
+        for i in range(sentences_per_page):
+            words = vocab[rng.integers(0, VOCAB_SIZE, size=rng.integers(5, 40))]
+            sentences.append(words[0].capitalize() + " " + " ".join(words[1:]) + ".")
+            if i % 8 == 7:
+                sentences.append("\n\n")
+        pages.append(" ".join(sentences))
+    return pages
+
+
+def _hash_uniform(seeds: np.ndarray, dim: int) -> np.ndarray:
+    # splitmix64 of (seed, dimension) -> floats in [-1, 1), fully vectorized
+    x = seeds.astype(np.uint64)[:, None] * np.uint64(dim) + np.arange(dim, dtype=np.uint64)[None, :]
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x = x ^ (x >> np.uint64(31))
+    return ((x >> np.uint64(11)).astype(np.float64) * (2.0 / 2**53) - 1.0).astype(np.float32)
+
+
+class HashingEmbedder:
+    """
+    Deterministic fake embedding model (same text -> same vector).
+    The vector mixes a component from the first word (the topic) with one
+    from the whole text, so chunks of a topic cluster like real embeddings.
+    """
+
+    def __init__(self, dim: int = 384, topic_weight: float = 0.8):
+        self.dim = dim
+        self.topic_weight = topic_weight
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        text_seeds = np.fromiter((zlib.crc32(t.encode("utf-8")) for t in texts), dtype=np.uint64, count=len(texts))
+        topic_seeds = np.fromiter(
+            (zlib.crc32(t.split(" ", 1)[0].encode("utf-8")) for t in texts), dtype=np.uint64, count=len(texts)
+        )
+        return (self.topic_weight * _hash_uniform(topic_seeds, self.dim)
+                + (1.0 - self.topic_weight) * _hash_uniform(text_seeds, self.dim))
+
+
+_TOKEN_RE = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+class RegexTokenizer:
+    """
+    Word-piece-like tokenizer with the call API of a Hugging Face fast tokenizer
+    (batch of texts in, input_ids / offset_mapping out). Long words are cut
+    every 4 characters, which gives token counts close to MiniLM's.
+    """
+
+    def __call__(self, texts: List[str], return_offsets_mapping: bool = False, **kwargs):
+        offsets = [[m.span() for m in _TOKEN_RE.finditer(text)] for text in texts]
+        encoded = {"input_ids": [list(range(len(o))) for o in offsets]}
+        if return_offsets_mapping:
+            encoded["offset_mapping"] = offsets
+        return encoded
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent
+
+# Importing app.qa_pipeline must not load any model or heavy extractor.
+# Override with IMPORT_TIME_BUDGET_S on slow machines.
+IMPORT_TIME_BUDGET_S = float(os.environ.get("IMPORT_TIME_BUDGET_S", "2.0"))
+
+HEAVY_MODULES = ["torch", "transformers", "sentence_transformers", "tabula", "pytesseract", "fitz"]
+
+
+def measure_import(module: str = "app.qa_pipeline"):
+    """
+    Import `module` in a fresh interpreter.
+    Returns (seconds, heavy modules that got imported along the way).
+    """
+    code = (
+        "import sys, time\n"
+        "t = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(time.perf_counter() - t)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.splitlines()
+    seconds = float(out[0])
+    heavy = [m for m in out[1].split(",") if m] if len(out) > 1 else []
+    return seconds, heavy
+
+
+def test_qa_pipeline_import_is_fast():
+    seconds, heavy = measure_import("app.qa_pipeline")
+    assert not heavy, f"import app.qa_pipeline pulled in heavy modules: {heavy}"
+    assert seconds < IMPORT_TIME_BUDGET_S, (
+        f"import app.qa_pipeline took {seconds:.2f}s (budget {IMPORT_TIME_BUDGET_S:.2f}s)"
+    )
+
+
+def main():
+    seconds, heavy = measure_import("app.qa_pipeline")
+    print(f"import app.qa_pipeline: {seconds:.3f}s (budget {IMPORT_TIME_BUDGET_S:.2f}s)")
+    print(f"Heavy modules imported: {heavy or 'none'}")
+    test_qa_pipeline_import_is_fast()
+    print("✅ Import time within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
-from app.qa_pipeline import build_qa_index_from_pdf, answer_question
+from app.qa_pipeline import load_or_build_qa_index, answer_question
 
 
 def main():
-    print("Building QA index from qatar_test_doc.pdf ...\n")
-    index = build_qa_index_from_pdf(pdf_name="qatar_test_doc.pdf", doc_id="qatar_report")
+    print("Loading QA index for qatar_test_doc.pdf (building it the first time) ...\n")
+    index = load_or_build_qa_index(pdf_name="qatar_test_doc.pdf", doc_id="qatar_report")
 
     print("Index built! You can now ask questions.\n")
 
@@ -10,7 +10,7 @@ def main():
 
     # 2) Chunk them into DocumentChunk objects
     doc_id = "sample_doc"
-    chunks = chunk_pdf_pages_to_document_chunks(doc_id, page_texts, max_words=200)
+    chunks = chunk_pdf_pages_to_document_chunks(doc_id, page_texts)
     print(f"Created {len(chunks)} chunks.\n")
 
     # 3) Build the text index
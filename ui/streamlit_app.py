@@ -6,23 +6,98 @@ ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
 
 import streamlit as st
-from app.qa_pipeline import build_qa_index_from_pdf, answer_question
+from app.qa_pipeline import stream_answer, warm_up_models
+from app.index import list_doc_ids
+from app.indexing_worker import BackgroundIndexer, save_uploaded_pdf
+from app.tracing import get_trace_stats, export_prometheus
+
+# One index for the UI; uploaded PDFs are added to it (doc_id = file name stem)
+INDEX_NAME = "qatar_report"
+DEFAULT_PDF = "qatar_test_doc.pdf"
+DEFAULT_DOC_ID = "qatar_report"
 
 st.set_page_config(page_title="Multi-Modal RAG QA", layout="wide")
 
 st.title("📄 Multi-Modal RAG QA System")
-st.write("Ask questions about your uploaded PDF document.")
+st.write("Ask questions about your uploaded PDF documents.")
+
+# Start loading the embedding model + LLM in the background (once per server),
+# so the page renders right away instead of waiting for the models
+@st.cache_resource
+def start_model_warm_up():
+    return warm_up_models(background=True)
+
 
-# Build index only once
+start_model_warm_up()
+
+# Index served by this server: loaded from disk if saved, otherwise built in
+# the background from the default PDF. Updates never block the page.
 @st.cache_resource
-def load_index():
-    with st.spinner("Building index from Qatar IMF PDF... (first time only)"):
-        index = build_qa_index_from_pdf(pdf_name="qatar_test_doc.pdf", doc_id="qatar_report")
-    return index
+def get_indexer():
+    indexer = BackgroundIndexer(INDEX_NAME)
+    # An unloadable saved index is reported, never replaced by the default PDF alone
+    if indexer.get_index() is None and indexer.load_error is None:
+        indexer.submit(DEFAULT_PDF, doc_id=DEFAULT_DOC_ID)
+    return indexer
+
+
+indexer = get_indexer()
+
+# Upload: the PDF goes to data/raw_docs, indexing runs in the background
+with st.sidebar.form("upload", clear_on_submit=True):
+    uploaded = st.file_uploader("📤 Add a PDF", type=["pdf"])
+    if st.form_submit_button("Index it") and uploaded is not None:
+        try:
+            pdf_name = save_uploaded_pdf(uploaded.name, uploaded.getvalue())
+            indexer.submit(pdf_name)
+            st.success(f"{pdf_name} queued for indexing.")
+        except (ValueError, OSError) as e:
+            st.error(f"Could not save {uploaded.name}: {e}")
 
 
-# Initialize index
-index = load_index()
+def show_indexing_status():
+    status = indexer.status()
+    if status["load_error"]:
+        st.error(status["load_error"])
+    current = status["current"]
+    if current is not None:
+        n_pages = current.get("n_pages") or 0
+        done = current.get("pages_done", 0)
+        st.progress(
+            done / n_pages if n_pages else 0.0,
+            text=f"Indexing {current['pdf_name']}: page {done}/{n_pages or '?'}, "
+            f"OCR queue {current.get('ocr_queue', 0)}",
+        )
+    if status["queued"]:
+        st.caption("Queued: " + ", ".join(status["queued"]))
+    for job in status["history"][:3]:
+        if job["state"] == "failed":
+            st.error(f"Indexing {job['pdf_name']} failed: {job['error']}")
+        else:
+            st.caption(f"✅ Indexed {job['pdf_name']} in {job['seconds']:.0f}s")
+    st.caption(f"Index: {status['n_chunks']} chunks")
+
+    # A new index was swapped in since this page was drawn: redraw the page
+    served = indexer.get_index()
+    if served is not None and served["version"] != st.session_state.get("index_version"):
+        st.rerun()
+
+
+# Refresh the status every few seconds without rerunning the whole page
+if hasattr(st, "fragment"):
+    show_indexing_status = st.fragment(run_every=2)(show_indexing_status)
+
+# The index currently served; a background update swaps in a new one between runs
+index = indexer.get_index()
+st.session_state.index_version = index["version"] if index is not None else None
+
+with st.sidebar:
+    show_indexing_status()
+
+if index is not None:
+    st.caption("Documents: " + ", ".join(list_doc_ids(index)))
+else:
+    st.info("The index is being built in the background (see the sidebar). Questions are enabled once it is ready.")
 
 # Chat history
 if "chat_history" not in st.session_state:
@@ -30,19 +105,48 @@ if "chat_history" not in st.session_state:
 
 # User input
 user_query = st.text_input("Ask a question about the document:")
+# "auto" answers with BM25 alone until the embedding model has finished loading
+search_mode = st.radio("Retrieval:", ["auto", "hybrid", "dense", "lexical"], horizontal=True)
 
-if st.button("Ask") and user_query.strip():
+if st.button("Ask", disabled=index is None) and user_query.strip():
 
-    with st.spinner("Thinking..."):
-        answer, chunks = answer_question(index, user_query, top_k=5)
+    # Show the answer token by token while it is generated
+    live_answer = st.empty()
+    live_answer.markdown("### 🤖 Answer:\n_Retrieving context..._")
 
-    # Save chat
-    st.session_state.chat_history.append((user_query, answer, chunks))
+    answer, chunks, metrics = "", [], {}
+    try:
+        for event in stream_answer(index, user_query, top_k=5, mode=search_mode):
+            if event["type"] == "chunks":
+                chunks = event["chunks"]
+                live_answer.markdown("### 🤖 Answer:\n_Thinking..._")
+            elif event["type"] == "token":
+                answer += event["text"]
+                live_answer.markdown(f"### 🤖 Answer:\n{answer}▌")
+            elif event["type"] == "done":
+                answer = event["answer"]
+                metrics = event["metrics"]
+    except Exception as e:
+        # Generation failed or stalled (see stream_answer): report it, keep the page
+        st.error(f"Could not answer: {e}")
+    else:
+        # Save chat
+        st.session_state.chat_history.append((user_query, answer, chunks, metrics))
+
+    live_answer.empty()
 
 # Display chat history
-for i, (q, a, cks) in enumerate(reversed(st.session_state.chat_history), 1):
+for i, (q, a, cks, metrics) in enumerate(reversed(st.session_state.chat_history), 1):
     st.markdown(f"### 🧑‍💻 You:\n{q}")
     st.markdown(f"### 🤖 Answer:\n{a}")
+    if metrics:
+        st.caption(
+            f"⏱ retrieval {metrics.get('retrieval_s', 0):.2f}s · "
+            f"first token {metrics.get('time_to_first_token_s', 0):.2f}s · "
+            f"total {metrics.get('total_s', 0):.2f}s · "
+            f"{metrics.get('mode', 'dense')} retrieval"
+            + (" · cached" if metrics.get("cached") else "")
+        )
 
     with st.expander("📍 Source chunks used"):
         for ch in cks:
@@ -55,3 +159,26 @@ for i, (q, a, cks) in enumerate(reversed(st.session_state.chat_history), 1):
             )
 
     st.markdown("---")
+
+# Optional debug panel: time per stage (ingestion + QA) for this server process
+if st.sidebar.checkbox("🛠 Show debug panel"):
+    trace = get_trace_stats()
+    st.sidebar.markdown("### ⏱ Time per stage")
+    st.sidebar.table(
+        [
+            {
+                "span": name,
+                "count": int(s["count"]),
+                "total s": round(s["total_seconds"], 3),
+                "max s": round(s["max_seconds"], 3),
+                "items": int(s["items"]),
+            }
+            for name, s in sorted(trace["spans"].items(), key=lambda item: -item[1]["total_seconds"])
+        ]
+    )
+    if trace["peak_rss_bytes"] is not None:
+        st.sidebar.caption(f"Peak RSS: {trace['peak_rss_bytes'] / 2**20:.0f} MB")
+    with st.sidebar.expander("Prometheus metrics"):
+        st.code(export_prometheus(), language="text")
+    with st.sidebar.expander("Recent spans"):
+        st.json(trace["recent"][-50:])